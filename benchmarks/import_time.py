@@ -0,0 +1,75 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT 
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or 
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along 
+# with qior. If not, see <https://www.gnu.org/licenses/>. 
+"""
+Startup-time benchmark of qior. Each of the imports below is timed in fresh
+interpreters, and the best time is compared with a budget. The script also
+checks that none of the heavy dependencies of qior is imported along. It
+exits with a non-zero status if any of the checks fails, so it can be used
+in continuous integration:
+
+    python benchmarks/import_time.py [--budget SECONDS] [--repeat N]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+# statements whose import time is measured, the second one is what
+# "python -m qior" runs before deploying the examples
+STATEMENTS = ("import qior", "import qior.example")
+
+HEAVY_MODULES = ("qutip", "scipy", "numpy", "matplotlib")
+
+PROGRAM = """
+import json, sys, time
+start = time.perf_counter()
+%s
+elapsed = time.perf_counter() - start
+heavy = [name for name in %r if name in sys.modules]
+print(json.dumps(dict(elapsed = elapsed, heavy = heavy)))
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--budget", type = float, default = 0.05,
+        help = "maximum import time in seconds (default: 0.05)")
+    parser.add_argument("--repeat", type = int, default = 5,
+        help = "number of fresh interpreters per statement (default: 5)")
+    args = parser.parse_args()
+
+    failed = False
+    for statement in STATEMENTS:
+        runs = [measure(statement) for _ in range(args.repeat)]
+        best = min(run["elapsed"] for run in runs)
+        heavy = sorted(set(name for run in runs for name in run["heavy"]))
+        print("%-22s %8.1f ms (budget %.1f ms)" % (statement, 1000*best, 1000*args.budget))
+        if best > args.budget:
+            print("    over budget")
+            failed = True
+        if heavy:
+            print("    imports heavy modules: %s" % ", ".join(heavy))
+            failed = True
+    sys.exit(1 if failed else 0)
+
+def measure(statement):
+    """
+    Return a dictionary with the time it takes to run "statement" in a fresh
+    interpreter and the heavy modules imported after running it.
+    """
+    program = PROGRAM % (statement, HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", program],
+        check = True, capture_output = True, text = True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    main()
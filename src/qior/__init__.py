@@ -22,14 +22,75 @@ this module is:
     - with_reflectivity: Convenience builder for a particular kind of input-
       output relation where phases are not important but only the magnitude
       of the reflectivity.
+    - InputOutputRelation.evolve_with_derivative: Compute the output state
+      together with its analytic derivative with respect to a parameter of
+      the relation, e.g. the reflectivity.
+    - sample: Draw samples of the photon numbers measured on the output
+      modes of a relation, or a chain of them, from a number state without
+      computing the output state.
+    - write_scan, ScanWriter, ScanReader: Stream the output states of large
+      scans to compressed chunks on disk and read them back lazily.
+    - with_loss, LossChannel: Photon loss on a single mode, equivalent to a
+      relation with an environment mode that is traced out, but without
+      building that environment.
+    - aevolve, EvaluationService: Asyncio front-end that builds relations
+      and evolves states in an executor without stalling the event loop.
+    - estimate: Predict the memory and floating point operations needed to
+      evolve a state, and choose the cheapest strategy that fits in memory.
+    - SparseState: Kets stored as a map from photon numbers to amplitudes,
+      evolved touching only the number states reachable from them.
+    - Workspace: Intermediate buffers reused across evolutions of numpy
+      arrays, so that repeated evolutions do not allocate.
+
+InputOutputRelation.evolve accepts numpy arrays and SparseState objects as
+well as qp.Qobj. Arrays are evolved without converting them to qp.Qobj,
+and the output can be written into a buffer provided by the user.
+
+Importing qior is cheap: qutip and numpy are imported the first time they
+are needed, and so are the submodules behind sample, write_scan,
+with_loss, aevolve, estimate, SparseState and Workspace. The examples,
+and their plotting dependencies, are never imported by qior.
 
 For more information see the doc strings of those objects as well as the
 examples provided in the repository
 """
+import importlib
 import math
-
-import numpy as np
-import qutip as qp
+import threading
+
+from ._lazy import LazyModule
+
+np = LazyModule("numpy")
+qp = LazyModule("qutip")
+sparse = LazyModule("scipy.sparse")
+fock = LazyModule("qior.fock")
+fockstate = LazyModule("qior.fockstate")
+buffers = LazyModule("qior.buffers")
+
+# names exported by qior that are defined in its submodules, imported the
+# first time they are accessed
+submodule_of = {
+    "sample": "sampling",
+    "write_scan": "store",
+    "ScanWriter": "store",
+    "ScanReader": "store",
+    "with_loss": "channels",
+    "LossChannel": "channels",
+    "aevolve": "aio",
+    "EvaluationService": "aio",
+    "estimate": "cost",
+    "SparseState": "fockstate",
+    "Workspace": "buffers",
+}
+
+def __getattr__(name):
+    if name in submodule_of:
+        module = importlib.import_module("." + submodule_of[name], __name__)
+        return getattr(module, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+def __dir__():
+    return sorted(list(globals()) + list(submodule_of))
 
 def with_reflectivity(*a, **kw):
     """
@@ -63,7 +124,13 @@ class InputOutputRelation:
 
     some_instances = dict()
 
-    def __init__(self, matrix, dims, acting_on = (0,1)):
+    # numpy dtypes of the real and complex arrays for each precision
+    precisions = {
+        "double": ("float64", "complex128"),
+        "single": ("float32", "complex64"),
+    }
+
+    def __init__(self, matrix, dims, acting_on = (0,1), precision = "double"):
         """
         Initialize an input-output relation.
 
@@ -98,8 +165,16 @@ class InputOutputRelation:
               Note that input-output relations represent passive processes
               where energy is conserved, so considering a bigger output state
               space is not necessary since energy is not going to be created.
+
+            - precision: either "double" or "single", the floating point
+              precision used when evolving numpy arrays, see evolve_array.
+              Single precision halves the memory used by the states and the
+              local unitary, at the cost of errors of about 1e-6.
         """
 
+        if precision not in self.precisions:
+            raise ValueError("precision must be one of %s" % (tuple(self.precisions),))
+
         if not self.is_unitary(matrix):
             raise ValueError("input-output relations must be unitary")
 
@@ -118,7 +193,69 @@ class InputOutputRelation:
         self.matrix = matrix
         self.dims = dims
         self.acting_on = acting_on
-        self.U = self.time_evolution()
+        self.precision = precision
+        self.global_U = None # see InputOutputRelation.U
+        self.global_U_dag = None # see InputOutputRelation.U_dag
+        self.local_U = None # numpy version of the local unitary, see local_unitary_array
+        self.local_U_conj = None # see local_unitary_conjugate
+        self.global_dU = dict() # see time_evolution_derivative
+        self.lock = threading.RLock() # so that U is built once across threads
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"] # locks can not be pickled
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    @property
+    def U(self):
+        """
+        The global time evolution operator, see time_evolution. It is only
+        built the first time it is needed, so relations that only evolve
+        numpy arrays never allocate it. Threads that need it while it is
+        being built wait for it instead of building it again.
+        """
+        if self.global_U is None:
+            with self.lock:
+                if self.global_U is None:
+                    self.global_U = self.time_evolution()
+        return self.global_U
+
+    @property
+    def U_dag(self):
+        """
+        The adjoint of self.U, computed the first time it is needed and
+        reused by every evolution of a density matrix.
+        """
+        if self.global_U_dag is None:
+            with self.lock:
+                if self.global_U_dag is None:
+                    self.global_U_dag = self.U.dag()
+        return self.global_U_dag
+
+    def is_real(self):
+        """
+        Return True iff all the coefficients in self.matrix are real, in
+        which case so are all the amplitudes of the time evolution operator
+        in the number basis.
+        """
+        return np.isrealobj(self.matrix) or not np.any(np.imag(self.matrix))
+
+    def array_dtype(self, state_dtype = None):
+        """
+        Return the numpy dtype used to evolve arrays of the given dtype, or
+        the dtype of the local unitary if "state_dtype" is None. Real dtypes
+        are only used if both the relation and the state are real.
+        """
+        real, complex_ = self.precisions[self.precision]
+        if not self.is_real():
+            return np.dtype(complex_)
+        if state_dtype is None or not np.issubdtype(state_dtype, np.complexfloating):
+            return np.dtype(real)
+        return np.dtype(complex_)
 
     @staticmethod
     def is_unitary(array):
@@ -127,6 +264,18 @@ class InputOutputRelation:
         UdU = np.matmul(array.conj().T, array)
         return np.allclose(identity, UdU)
 
+    def mode_matrix(self):
+        """
+        Return a numpy array with shape (len(self.dims), len(self.dims))
+        containing the coefficients of this relation for all the modes,
+        following the same convention as the "matrix" argument of
+        __init__. The modes this relation does not act on are left
+        unchanged.
+        """
+        matrix = np.eye(len(self.dims), dtype = complex)
+        matrix[np.ix_(self.acting_on, self.acting_on)] = self.matrix
+        return matrix
+
     def time_evolution(self):
         """
         Return a qp.Qobj representing the unitary evolution that turns
@@ -180,11 +329,70 @@ class InputOutputRelation:
             output_operator = self.output2() / math.sqrt(n2)
             return output_operator * self.evolve_photon_numbers(n1, n2 - 1)
 
+    def time_evolution_derivative(self, dmatrix):
+        """
+        Return a qp.Qobj representing the derivative of self.U with respect
+        to a parameter theta of the relation. The argument "dmatrix" is the
+        derivative of self.matrix with respect to that same parameter, see
+        InputOutputRelation.reflectivity_matrix_derivative for an example.
+
+        The derivative is computed in the same pass as self.U, which is
+        stored if it was not built yet, and cached for each "dmatrix".
+        """
+        dmatrix = np.asarray(dmatrix)
+        key = (dmatrix.dtype.str, dmatrix.tobytes())
+        if key not in self.global_dU:
+            with self.lock:
+                if key not in self.global_dU:
+                    U, dU = self.local_time_evolution_with_derivative(dmatrix)
+                    if self.global_U is None:
+                        self.global_U = self.expand_to_bigger_system(U)
+                    self.global_dU[key] = self.expand_to_bigger_system(dU)
+        return self.global_dU[key]
+
+    def local_time_evolution_with_derivative(self, dmatrix):
+        """
+        Return a tuple of two qp.Qobj: the local time evolution operator, see
+        local_time_evolution, and its derivative with respect to a parameter
+        theta, given dmatrix, the derivative of self.matrix with respect to
+        theta. Both operators are computed in the same pass over the number
+        states of the input modes.
+
+        The output states of each pair of photon numbers are kept, so that
+        each of them is computed from the previous one with a single product,
+        as in evolve_photon_numbers. Since the creation operators of the input
+        modes commute, the derivatives follow from the product rule applied
+        to each of the output creation operators used to build those states.
+        """
+        U = self.local_zero_operator()
+        dU = self.local_zero_operator()
+        d1, d2 = self.local_dims()
+        outputs = (self.output1(), self.output2())
+        doutputs = (self.output1(dmatrix), self.output2(dmatrix))
+        kets = dict()
+        for n1 in range(d1):
+            for n2 in range(d2):
+                if n1 == 0 and n2 == 0:
+                    vacuum = self.local_vacuum()
+                    ket, dket = vacuum, 0 * vacuum
+                else:
+                    mode, n, previous = (0, n1, (n1 - 1, n2)) if n1 else (1, n2, (n1, n2 - 1))
+                    ket, dket = kets[previous]
+                    output_operator = outputs[mode] / math.sqrt(n)
+                    doutput_operator = doutputs[mode] / math.sqrt(n)
+                    ket, dket = output_operator * ket, \
+                                doutput_operator * ket + output_operator * dket
+                kets[n1, n2] = ket, dket
+                bra = qp.tensor(qp.basis(d1, n1), qp.basis(d2, n2)).dag()
+                U += self.to_sparse(ket * bra)
+                dU += self.to_sparse(dket * bra)
+        return U, dU
+
     def local_vacuum(self):
         d1, d2 = self.local_dims()
         return qp.tensor(qp.basis(d1), qp.basis(d2))
 
-    def output1(self):
+    def output1(self, matrix = None):
         """
         Return the creation operator of the first output mode as a weighted
         sum of the creation operators of the input modes.
@@ -193,19 +401,26 @@ class InputOutputRelation:
         vacuum in the output modes, but to create a photon from a
         superposition of photons in the input modes that end up as a single
         photon on this output mode.
+
+        The weights are taken from self.matrix unless another 2x2 array is
+        given with the "matrix" argument.
         """
-        return self.matrix[0, 0] * self.input1() + \
-               self.matrix[0, 1] * self.input2()
+        if matrix is None:
+            matrix = self.matrix
+        return matrix[0, 0] * self.input1() + \
+               matrix[0, 1] * self.input2()
 
-    def output2(self):
+    def output2(self, matrix = None):
         """
         Return the creation operator of the second output mode as a wighted
         sum of the creation operators fothe input modes.
 
         See output1.__doc__ for more information.
         """
-        return self.matrix[1, 0] * self.input1() + \
-               self.matrix[1, 1] * self.input2()
+        if matrix is None:
+            matrix = self.matrix
+        return matrix[1, 0] * self.input1() + \
+               matrix[1, 1] * self.input2()
 
     def input1(self):
         """
@@ -226,43 +441,33 @@ class InputOutputRelation:
         Take a qutip.Qobj operator defined on the input-output modes alone
         and tensor-wrap it with identities so that it becomes a global
         operator.
-        """
-        new_dims = self.permute_dims()
-
-        for D in new_dims[2:]:
-            U = qp.tensor(U, qp.qeye(D))
-
-        return self.permute_back_unitary(U)
 
-    def permute_dims(self):
+        Instead of tensor products and permutations of qp.Qobj, the global
+        operator is assembled directly from the non-zero elements of U: the
+        element [l1, l2] of U is copied to the global elements whose indices
+        are the rows l1 and l2 of the pair map of self.acting_on, see
+        qior.fock.FockIndex.pair_map.
         """
-        Return a rearrangement of self.dims so that the local dimensions
-        are in the two first entries.
-        """
-        new_dims = list(self.dims)
-        new_dims[0] = self.dims[self.acting_on[0]]
-        new_dims[self.acting_on[0]] = self.dims[0]
-        new_new_dims = list(new_dims)
-        new_new_dims[1] = new_dims[self.acting_on[1]]
-        new_new_dims[self.acting_on[1]] = new_dims[1]
-        return new_new_dims
+        pair_map = self.fock_index().pair_map(self.acting_on)
+        local = U.full()
+        rows, columns = np.nonzero(local)
+        size = pair_map.size
+        U = sparse.csr_matrix((
+                np.repeat(local[rows, columns], pair_map.shape[1]),
+                (pair_map[rows].ravel(), pair_map[columns].ravel())),
+            shape = (size, size))
+        dims = list(self.dims)
+        return qp.Qobj(U, dims = [dims, dims])
 
-    def permute_back_unitary(self, U):
+    def fock_index(self):
         """
-        Return U with the tensor order permuted so that the two first
-        subsystems end up at indices self.acting_on[0] and self.acting_on[1]
+        Return the qior.fock.FockIndex of self.dims, shared by all the
+        relations with the same dims.
         """
-        identity = list(range(len(self.dims)))
-        first_permutation = list(identity)
-        first_permutation[1] = identity[self.acting_on[1]]
-        first_permutation[self.acting_on[1]] = identity[1]
-        second_permutation = list(first_permutation)
-        second_permutation[0] = first_permutation[self.acting_on[0]]
-        second_permutation[self.acting_on[0]] = first_permutation[0]
-        return U.permute(second_permutation)
+        return fock.fock_index(tuple(self.dims))
 
     @classmethod
-    def with_reflectivity(cls, R, dims, acting_on = (0, 1)):
+    def with_reflectivity(cls, R, dims, acting_on = (0, 1), precision = "double"):
         """
         A typical parameter used to enunciate input-output relations is 
         reflectivity. This method allows the user to create relations with
@@ -301,25 +506,44 @@ class InputOutputRelation:
         method to change its behaviour that way.
 
         With these statements, it is safe to define the argument "R" as the
-        reflectivity. The arguments "dims" and "acting_on" have the same 
-        meaning as in cls.__init__
+        reflectivity. The arguments "dims", "acting_on" and "precision" have
+        the same meaning as in cls.__init__. Since these relations are real,
+        numpy arrays with real dtypes are evolved with real arithmetic.
         """
-        key = (R, dims, acting_on)
+        key = (R, dims, acting_on, precision)
         self = cls.some_instances.get(key, None)
         if self is None:
             array = np.matrix([[math.sqrt(R), math.sqrt(1-R)],
                                [math.sqrt(1-R), -math.sqrt(R)]])
-            return cls(array, dims, acting_on)
+            return cls(array, dims, acting_on, precision)
         else:
             return self
 
-    def __call__(self, state):
+    @staticmethod
+    def reflectivity_matrix_derivative(R):
+        """
+        Return the derivative with respect to R of the matrix that
+        with_reflectivity uses to build a relation with reflectivity R. Use
+        it as the "dmatrix" argument of evolve_with_derivative to compute
+        derivatives of output states with respect to the reflectivity.
+
+        The derivative diverges at R = 0 and R = 1, so R must lie strictly
+        between them.
+        """
+        if not 0 < R < 1:
+            raise ValueError("the derivative with respect to the reflectivity is only defined for 0 < R < 1")
+        dr = 1 / (2 * math.sqrt(R))
+        dt = -1 / (2 * math.sqrt(1-R))
+        return np.array([[dr, dt],
+                         [dt, -dr]])
+
+    def __call__(self, state, **kw):
         """
         Return the final state resulting of applying "self" to "state"
         """
-        return self.evolve(state)
+        return self.evolve(state, **kw)
 
-    def evolve(self, initial_state):
+    def evolve(self, initial_state, dims = None, out = None, workspace = None):
         """
         Apply the unitary matrix computed in self.time_evolution_operator()
         to an initial_state and return the final state. The initial state must
@@ -349,7 +573,18 @@ class InputOutputRelation:
 
            so that the output state does not evolve outside of the cutoff. If
            it does leak outside the cutoff, and exception is thrown
-        """
+
+        The initial state may also be a numpy array, see evolve_array, in
+        which case the arguments "dims", "out" and "workspace" are passed
+        along to it, or a qior.SparseState, see SparseState.evolve. The
+        arguments "out" and "workspace" are only accepted for numpy arrays.
+        """
+        if isinstance(initial_state, np.ndarray):
+            return self.evolve_array(initial_state, dims, out, workspace)
+        if out is not None or workspace is not None:
+            raise ValueError("out and workspace are only used to evolve numpy arrays, not %s" % type(initial_state).__name__)
+        if isinstance(initial_state, fockstate.SparseState):
+            return initial_state.evolve(self)
         if self.output_leaks_outside_dims(initial_state):
             dims = initial_state.dims[0]
             raise ValueError(("given the input output relation %s and its" + \
@@ -358,15 +593,234 @@ class InputOutputRelation:
         if self.is_pure(initial_state):
             return self.U * initial_state
         else:
-            return self.U * initial_state * self.U.dag()
+            return self.U * initial_state * self.U_dag
+
+    def evolve_array(self, initial_state, dims = None, out = None, workspace = None):
+        """
+        Return the final state resulting from applying "self" to the numpy
+        array "initial_state", without converting it to a qp.Qobj.
+
+        The array must be C-contiguous and contain either a ket, with shape
+        (D,) or (D, 1), or a density matrix, with shape (D, D), where D is
+        the product of the dimensions in "dims". The argument "dims" is
+        optional, but if given it must match self.dims.
+
+        The local unitary acting on the two input modes is applied to the
+        amplitudes of the state gathered with the pair map of self.acting_on,
+        see qior.fock.FockIndex.pair_map, so the global unitary self.U is not
+        used. The result is scattered into "out", which must be a C-contiguous
+        array with the same shape as "initial_state", and returned. If "out"
+        is None, a new array is returned. The initial state itself can be
+        given as "out" to evolve it in place.
+
+        The dtype of the final state is real if both the relation and the
+        initial state are, see is_real, and its precision is given by
+        self.precision, see array_dtype.
+
+        The intermediate arrays are taken from "workspace", a qior.Workspace,
+        so that repeated calls with the same workspace and "out" arrays do
+        not allocate. If it is None, a new workspace is used in each call.
+
+        The same cutoffs as in evolve are checked, see evolve.__doc__
+        """
+        if dims is None:
+            dims = self.dims
+        elif not list(dims) == list(self.dims):
+            raise ValueError("the dims of the state %s do not match the dims of the relation %s" % (dims, self.dims))
+        dims = tuple(dims)
+        D = math.prod(dims)
+
+        if not initial_state.flags.c_contiguous:
+            raise ValueError("the initial state must be a C-contiguous array")
+        if initial_state.size == D:
+            pure = True
+            state = initial_state.reshape(D)
+        elif initial_state.shape == (D, D):
+            pure = False
+            state = initial_state
+        else:
+            raise ValueError("an array with shape %s is neither a ket nor a density matrix with dims %s" % (initial_state.shape, dims))
+
+        if workspace is None:
+            workspace = buffers.Workspace()
+        if self.array_leaks_outside_dims(state, pure, workspace):
+            raise ValueError(("given the input output relation %s and its" + \
+            " cutoffs %s, the output state is not contained within those " + \
+            "cutoffs") % (self, list(dims)))
+
+        dtype = self.array_dtype(initial_state.dtype)
+        if out is None:
+            out = np.empty(initial_state.shape, dtype = dtype)
+        elif not out.shape == initial_state.shape or not out.flags.c_contiguous:
+            raise ValueError("out must be a C-contiguous array with the same shape as the initial state")
+        elif not np.can_cast(dtype, out.dtype, "same_kind"):
+            raise ValueError("out must be able to hold values of dtype %s" % dtype)
+        self.apply_local_unitary(state, pure, out.reshape(state.shape), workspace)
+        return out
+
+    def apply_local_unitary(self, state, pure, out, workspace):
+        """
+        Write into "out" the result of applying the local unitary to "state",
+        a ket with shape (D,) if "pure", or a density matrix with shape
+        (D, D) otherwise, using the buffers in "workspace".
+
+        The amplitudes of the state are gathered with the pair map, so that
+        the local unitary acts on its rows, and then scattered back. Since
+        gathering copies the state, "out" may be "state" itself.
+        """
+        U = self.local_unitary_array()
+        pair_map = self.fock_index().pair_map(self.acting_on)
+        dtype = self.array_dtype(state.dtype)
+        if not U.dtype == dtype:
+            U = self.cast(U, dtype, "rows unitary", workspace)
+        gathered = self.gather(state, 0, dtype, "rows", workspace)
+        product = workspace.buffer("rows product", gathered.shape, dtype)
+        # U rho: the local unitary acts on the rows of rho
+        np.matmul(U, gathered.reshape(len(U), -1), out = product.reshape(len(U), -1))
+        out[pair_map] = product
+        if pure:
+            return
+        # (U rho) U^dagger: the conjugate of the local unitary acts on columns
+        dtype = np.result_type(dtype, out.dtype)
+        conjugate = self.local_unitary_conjugate()
+        if not conjugate.dtype == dtype:
+            conjugate = self.cast(conjugate, dtype, "columns unitary", workspace)
+        gathered = self.gather(out, 1, dtype, "columns", workspace)
+        product = workspace.buffer("columns product", gathered.shape, dtype)
+        np.matmul(conjugate, gathered, out = product)
+        out[:, pair_map] = product
+
+    def gather(self, array, axis, dtype, name, workspace):
+        """
+        Return the amplitudes of "array" along "axis" ordered by the pair map
+        of self.acting_on, with the given dtype, in the buffer "name" of
+        "workspace".
+        """
+        pair_map = self.fock_index().pair_map(self.acting_on)
+        shape = array.shape[:axis] + pair_map.shape + array.shape[axis + 1:]
+        if array.dtype == dtype:
+            gathered = workspace.buffer(name, shape, dtype)
+            np.take(array, pair_map, axis = axis, out = gathered, mode = "clip")
+            return gathered
+        # np.take can not cast, so gather in the dtype of the array first
+        uncast = workspace.buffer(name + " uncast", shape, array.dtype)
+        np.take(array, pair_map, axis = axis, out = uncast, mode = "clip")
+        return self.cast(uncast, dtype, name, workspace)
+
+    @staticmethod
+    def cast(array, dtype, name, workspace):
+        """
+        Return a copy of "array" with the given dtype in the buffer "name" of
+        "workspace"
+        """
+        copy = workspace.buffer(name, array.shape, dtype)
+        np.copyto(copy, array, casting = "same_kind")
+        return copy
+
+    def local_unitary_conjugate(self):
+        """
+        Return the complex conjugate of local_unitary_array, cached
+        """
+        if self.local_U_conj is None:
+            self.local_U_conj = self.local_unitary_array().conj()
+        return self.local_U_conj
+
+    def local_unitary_array(self):
+        """
+        Return the local time evolution operator as a numpy array with shape
+        (d1*d2, d1*d2), with d1 and d2 the dimensions of the input modes.
+
+        The array is real if self.matrix is, and its precision is set by
+        self.precision.
+        """
+        if self.local_U is None:
+            U = self.local_time_evolution().full()
+            if self.is_real():
+                U = U.real
+            self.local_U = U.astype(self.array_dtype())
+        return self.local_U
+
+    def evolve_with_derivative(self, initial_state, dmatrix, observable = None):
+        """
+        Return a tuple with the final state computed as in evolve and its
+        derivative with respect to a parameter theta of this relation, given
+        dmatrix, the derivative of self.matrix with respect to theta.
+
+        For example, the derivative of the output of a relation built with
+        with_reflectivity(R, dims) with respect to R is
+
+            relation.evolve_with_derivative(state,
+                InputOutputRelation.reflectivity_matrix_derivative(R))
+
+        If a qp.Qobj operator is given as the "observable" argument, the tuple
+        contains instead the expectation value of that observable on the
+        final state and its derivative with respect to theta. The derivative
+        is exact, and costs about as much as building the relation once,
+        instead of the two constructions and evolutions per parameter that
+        finite differences need.
+
+        Unlike evolve, only qp.Qobj initial states are supported.
+        """
+        if not isinstance(initial_state, qp.Qobj):
+            raise ValueError("evolve_with_derivative only accepts qp.Qobj initial states, not %s" % type(initial_state).__name__)
+        dU = self.time_evolution_derivative(dmatrix) # builds self.U too
+        output = self.evolve(initial_state)
+        if self.is_pure(initial_state):
+            doutput = dU * initial_state
+        else:
+            dleft = dU * initial_state * self.U_dag
+            doutput = dleft + dleft.dag()
+        if observable is None:
+            return output, doutput
+        if self.is_pure(initial_state):
+            dexpect = 2 * output.overlap(observable * doutput).real
+        else:
+            dexpect = (observable * doutput).tr().real
+        return qp.expect(observable, output), dexpect
 
     def output_leaks_outside_dims(self, initial_state):
         """
         Return True iff the initial_state would result in a final state
         that leaks ouside of the dimensions specified in self.dims
         """
-        N0 = self.max_number_of_photons(initial_state, self.acting_on[0])
-        N1 = self.max_number_of_photons(initial_state, self.acting_on[1])
+        if self.is_pure(initial_state):
+            probabilities = abs(initial_state.full().ravel())**2
+        else:
+            probabilities = initial_state.diag().real
+        return self.probabilities_leak_outside_dims(probabilities)
+
+    def probabilities_leak_outside_dims(self, probabilities):
+        """
+        Return True iff a state whose number states have the given numpy
+        array of probabilities would result in a final state that leaks
+        outside of the dimensions specified in self.dims
+        """
+        index = self.fock_index()
+        N0 = index.max_number_of_photons(probabilities, self.acting_on[0])
+        N1 = index.max_number_of_photons(probabilities, self.acting_on[1])
+        if N0 + N1 >= self.dims[self.acting_on[0]]:
+            return True
+        if N0 + N1 >= self.dims[self.acting_on[1]]:
+            return True
+        return False
+
+    def array_leaks_outside_dims(self, state, pure, workspace):
+        """
+        Return True iff the numpy array "state", a ket if "pure" or a density
+        matrix otherwise, would result in a final state that leaks outside
+        of the dimensions specified in self.dims. The intermediate arrays
+        are taken from "workspace", see evolve_array.
+        """
+        occupations = self.fock_index().occupations
+        if pure:
+            amplitudes = state
+        else:
+            amplitudes = np.diagonal(state).real
+        support = workspace.buffer("support", amplitudes.shape, bool)
+        np.not_equal(amplitudes, 0, out = support)
+        photons = workspace.buffer("photons", amplitudes.shape, occupations.dtype)
+        N0 = np.multiply(occupations[self.acting_on[0]], support, out = photons).max()
+        N1 = np.multiply(occupations[self.acting_on[1]], support, out = photons).max()
         if N0 + N1 >= self.dims[self.acting_on[0]]:
             return True
         if N0 + N1 >= self.dims[self.acting_on[1]]:
@@ -378,28 +832,22 @@ class InputOutputRelation:
         Return the photon number of the photon state that has a non-zero
         projection onto "state" with highest photon number.
         """
-        d = self.dims[subsystem]
-        nmax = d - 1
-        while not nmax == 0:
-            proj = self.projector_on_photon_number_eigenspace(state, subsystem, nmax)
-            exp_val = qp.expect(proj, state)
-            if exp_val:
-                return nmax
-            nmax -= 1
-        return nmax
+        if self.is_pure(state):
+            probabilities = abs(state.full().ravel())**2
+        else:
+            probabilities = state.diag().real
+        return self.fock_index().max_number_of_photons(probabilities, subsystem)
 
     @staticmethod
     def projector_on_photon_number_eigenspace(state, subsystem, eigenvalue):
-        dims = state.dims[0]
-        opers = []
-        for i, d in enumerate(dims):
-            if i == subsystem:
-                vec = qp.basis(d, eigenvalue)
-                proj = vec * vec.dag()
-                opers.append(proj)
-            else:
-                opers.append(qp.qeye(d))
-        return qp.tensor(*opers)
+        """
+        Return the projector onto the number states of "state" in which
+        "subsystem" has "eigenvalue" photons, as a diagonal qp.Qobj.
+        """
+        dims = [int(D) for D in state.dims[0]]
+        occupations = fock.fock_index(tuple(dims)).occupations[subsystem]
+        projector = sparse.diags((occupations == eigenvalue).astype(float), format = "csr")
+        return qp.Qobj(projector, dims = [dims, dims])
 
     @classmethod
     def is_pure(cls, state):
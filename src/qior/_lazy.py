@@ -0,0 +1,36 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT 
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or 
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along 
+# with qior. If not, see <https://www.gnu.org/licenses/>. 
+"""
+Deferred imports of the heavy dependencies of qior, so that "import qior"
+does not import qutip, scipy nor numpy until they are first used.
+"""
+import importlib
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported the first time one of its
+    attributes is accessed. Attributes are then cached on the stand-in, so
+    later accesses cost the same as on the module itself.
+    """
+
+    def __init__(self, name):
+        self.__name = name
+
+    def __getattr__(self, attribute):
+        module = importlib.import_module(self.__name)
+        value = getattr(module, attribute)
+        setattr(self, attribute, value)
+        return value
+
+    def __repr__(self):
+        return "<lazily imported module %r>" % self.__name
@@ -0,0 +1,180 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT 
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or 
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along 
+# with qior. If not, see <https://www.gnu.org/licenses/>. 
+"""
+Asyncio front-end for building input-output relations and evolving states.
+
+Building an InputOutputRelation and calling its evolve method are
+synchronous and CPU-bound, so calling them from a coroutine stalls the
+event loop. The coroutines in this module run them in an executor instead:
+    - aevolve: evolve a state with a relation in an executor
+    - EvaluationService: a job queue with a fixed number of workers, whose
+      constructions of identical relations that are in flight at the same
+      time are shared, and whose bounded queue makes producers wait when
+      it is full.
+
+By default the work runs in a concurrent.futures.ThreadPoolExecutor in the
+same process, but any executor can be used.
+"""
+import asyncio
+import concurrent.futures
+import functools
+
+import numpy as np
+
+async def aevolve(relation, state, executor = None, **kw):
+    """
+    Return the final state resulting of applying "relation" to "state", see
+    InputOutputRelation.evolve, computed in "executor", or in the default
+    executor of the running event loop if None.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(relation.evolve, state, **kw))
+
+class EvaluationService:
+    """
+    Asynchronous job queue that builds relations and evolves states with
+    them in an executor. Use it as an asynchronous context manager:
+
+        async with EvaluationService() as service:
+            output = await service.evaluate(qior.with_reflectivity, (R, dims), state)
+
+    Relations are built by calling a builder, e.g. qior.with_reflectivity
+    or qior.InputOutputRelation, with some arguments. Concurrent requests of
+    the same builder with the same arguments share a single construction.
+    """
+
+    def __init__(self, executor = None, workers = 4, max_pending = 64):
+        """
+        Initialize a service.
+
+        Arguments:
+            - executor: a concurrent.futures.Executor in which relations are
+              built and states evolved. By default, a ThreadPoolExecutor
+              with "workers" threads owned by the service.
+
+            - workers: the number of jobs that run at the same time.
+
+            - max_pending: the maximum number of jobs waiting in the queue.
+              Submitting a job to a full queue waits until there is room.
+        """
+        if workers < 1:
+            raise ValueError("the service needs at least one worker")
+        self.owns_executor = executor is None
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self.executor = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self.in_flight = dict()
+        self.queue = None
+        self.tasks = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def start(self):
+        """
+        Start the workers that take jobs from the queue
+        """
+        self.queue = asyncio.Queue(self.max_pending)
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+
+    async def close(self):
+        """
+        Wait for the jobs in the queue to finish and stop the workers
+        """
+        if self.queue is not None:
+            await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions = True)
+        self.tasks = []
+        if self.owns_executor:
+            self.executor.shutdown()
+
+    async def run(self, function, *args, **kw):
+        """
+        Return function(*args, **kw), computed in the executor
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kw))
+
+    async def relation(self, builder, *args):
+        """
+        Return builder(*args), built in the executor. If the same builder
+        is already running with equal arguments, wait for its result instead
+        of building the relation again.
+        """
+        key = (builder, tuple(map(hashable, args)))
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.run(builder, *args))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # shielded, so that a cancelled caller does not cancel the others
+        return await asyncio.shield(future)
+
+    async def submit(self, builder, args, state, **kw):
+        """
+        Put in the queue the job of evolving "state" with the relation
+        builder(*args), see evolve, and return an asyncio.Future with its
+        final state. If the queue is full, wait until there is room.
+        """
+        if self.queue is None:
+            raise RuntimeError("the service must be started before submitting jobs")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((builder, tuple(args), state, kw, future))
+        return future
+
+    async def evaluate(self, builder, args, state, **kw):
+        """
+        Return the final state resulting from applying the relation
+        builder(*args) to "state", computed through the queue.
+        """
+        return await (await self.submit(builder, args, state, **kw))
+
+    async def work(self):
+        """
+        Take jobs from the queue and run them, until cancelled
+        """
+        while True:
+            builder, args, state, kw, future = await self.queue.get()
+            try:
+                if not future.done():
+                    relation = await self.relation(builder, *args)
+                    final_state = await self.run(relation.evolve, state, **kw)
+                    if not future.done():
+                        future.set_result(final_state)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            finally:
+                self.queue.task_done()
+
+def hashable(argument):
+    """
+    Return a hashable version of an argument of a builder, so that equal
+    numpy arrays and lists give equal keys.
+    """
+    if isinstance(argument, np.ndarray):
+        return ("array", argument.dtype.str, argument.shape, argument.tobytes())
+    if isinstance(argument, (list, tuple)):
+        return tuple(map(hashable, argument))
+    return argument
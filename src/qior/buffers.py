@@ -0,0 +1,68 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT 
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or 
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along 
+# with qior. If not, see <https://www.gnu.org/licenses/>. 
+"""
+Reusable intermediate buffers for repeated evolutions of numpy arrays.
+"""
+import math
+
+import numpy as np
+
+class Workspace:
+    """
+    Named numpy arrays reused by InputOutputRelation.evolve_array across
+    calls. Pass the same workspace, and an "out" array, to repeated calls:
+
+        workspace = qior.Workspace()
+        for state in states:
+            relation.evolve(state, out = final_state, workspace = workspace)
+
+    The first call allocates the intermediate buffers, sized for the dims
+    of the relation and the kind of state, and the next ones reuse them, so
+    they do not allocate any array the size of the state. The number of
+    buffers allocated so far is counted in self.allocations, so that this
+    can be checked. A workspace can be shared by relations with the same
+    dims, but not by evolutions running at the same time.
+    """
+
+    def __init__(self):
+        self.buffers = dict()
+        self.allocations = 0
+
+    def buffer(self, name, shape, dtype):
+        """
+        Return the buffer called "name" as an array with the given shape and
+        dtype. It is only allocated if it does not exist yet, or if it was
+        allocated with another size or dtype; otherwise the same memory is
+        returned, reshaped if needed. Its contents are undefined.
+        """
+        dtype = np.dtype(dtype)
+        size = math.prod(shape)
+        array = self.buffers.get(name)
+        if array is None or not array.size == size or not array.dtype == dtype:
+            array = np.empty(size, dtype = dtype)
+            self.buffers[name] = array
+            self.allocations += 1
+        return array.reshape(shape)
+
+    @property
+    def nbytes(self):
+        """
+        The memory held by the buffers, in bytes
+        """
+        return sum(array.nbytes for array in self.buffers.values())
+
+    def clear(self):
+        """
+        Release the buffers
+        """
+        self.buffers = dict()
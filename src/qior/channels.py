@@ -0,0 +1,167 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT 
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or 
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along 
+# with qior. If not, see <https://www.gnu.org/licenses/>. 
+"""
+Photon loss on a single mode without an explicit environment mode.
+
+A lossy mode is often modelled with an extra environment mode in vacuum, a
+beam splitter between the two, and a partial trace over the environment:
+
+    relation = with_reflectivity(eta, dims + (d_env,), acting_on = (mode, env))
+    output = relation(input).ptrace(system modes)
+
+The LossChannel in this module gives the same output state, but applies the
+Kraus operators of that construction directly to the density matrix of the
+system, so neither the bigger unitary nor the bigger state are built.
+"""
+import math
+
+import numpy as np
+import qutip as qp
+
+def with_loss(eta, dims, mode = 0):
+    """
+    See LossChannel.__init__ docstring
+    """
+    return LossChannel(eta, dims, mode)
+
+class LossChannel:
+    """
+    Pure-loss channel on one mode, where each photon stays in the mode with
+    probability eta and is lost otherwise. It follows the convention of
+    with_reflectivity: a photon is lost when it is transmitted into an
+    environment mode in vacuum, so eta is the reflectivity of that
+    transmission.
+
+    Since the environment is traced out, the channel turns kets into density
+    matrices. Its Kraus operators are
+
+        E_k = sum_n sqrt(binomial(n, k) eta^(n-k) (1-eta)^k) |n-k><n|
+
+    for k lost photons, which map the number states with n photons to those
+    with n-k photons, so the output state never leaks outside the cutoffs.
+    """
+
+    def __init__(self, eta, dims, mode = 0):
+        """
+        Initialize a loss channel.
+
+        Arguments:
+            - eta: the probability of a photon to stay in the mode, a real
+              number between 0 and 1, both included.
+
+            - dims: an iterable of integers with the cutoffs of each of the
+              subsystems, as in InputOutputRelation.__init__
+
+            - mode: the index of the subsystem in "dims" that loses photons.
+        """
+        if not 0 <= eta <= 1:
+            raise ValueError("the probability of a photon not being lost must be between 0 and 1")
+
+        if mode < 0 or len(dims) <= mode:
+            raise ValueError("loss channels must act on systems whose state dimension is provided with the 'dims' argument, not outside its indices")
+
+        self.eta = eta
+        self.dims = dims
+        self.mode = mode
+        self.coefficients = self.kraus_coefficients()
+
+    def kraus_coefficients(self):
+        """
+        Return a numpy array whose element [k, n] is the coefficient of
+        |n><n+k| in the Kraus operator E_k, see LossChannel.__doc__
+        """
+        d = self.dims[self.mode]
+        coefficients = np.zeros((d, d))
+        for k in range(d):
+            for n in range(d - k):
+                coefficients[k, n] = math.sqrt(math.comb(n + k, k) *
+                    self.eta**n * (1 - self.eta)**k)
+        return coefficients
+
+    def __call__(self, state, **kw):
+        """
+        Return the final state resulting of applying "self" to "state"
+        """
+        return self.evolve(state, **kw)
+
+    def evolve(self, initial_state, dims = None, out = None):
+        """
+        Return the density matrix resulting from applying the channel to the
+        initial state, a ket or a density matrix given as a qp.Qobj or as a
+        numpy array.
+
+        Numpy arrays are handled as in InputOutputRelation.evolve_array, but
+        the final state is always a density matrix with shape (D, D), where
+        D is the product of the dimensions in "dims". It is written into
+        "out" if given.
+        """
+        if isinstance(initial_state, np.ndarray):
+            return self.evolve_array(initial_state, dims, out)
+        dims = [int(D) for D in initial_state.dims[0]]
+        if self.is_pure(initial_state):
+            initial_state = initial_state * initial_state.dag()
+        final_state = self.evolve_array(initial_state.full(), dims)
+        return qp.Qobj(final_state, dims = [dims, dims])
+
+    def evolve_array(self, initial_state, dims = None, out = None):
+        """
+        See evolve.__doc__
+        """
+        if dims is None:
+            dims = self.dims
+        elif not list(dims) == list(self.dims):
+            raise ValueError("the dims of the state %s do not match the dims of the channel %s" % (dims, self.dims))
+        dims = tuple(dims)
+        D = math.prod(dims)
+
+        if initial_state.size == D:
+            ket = initial_state.reshape(D, 1)
+            initial_state = ket * ket.conj().T
+        elif not initial_state.shape == (D, D):
+            raise ValueError("an array with shape %s is neither a ket nor a density matrix with dims %s" % (initial_state.shape, dims))
+
+        final_state = self.apply_kraus_operators(initial_state.reshape(dims + dims))
+        if out is None:
+            out = np.empty((D, D), dtype = final_state.dtype)
+        elif not out.shape == (D, D) or not out.flags.c_contiguous:
+            raise ValueError("out must be a C-contiguous array with shape (%d, %d)" % (D, D))
+        np.copyto(out.reshape(final_state.shape), final_state)
+        return out
+
+    def apply_kraus_operators(self, rho):
+        """
+        Return sum_k E_k rho E_k^dagger for the density matrix "rho", given
+        as a numpy array with two indices per subsystem, the indices of the
+        kets before those of the bras.
+
+        E_k maps |n + k><m + k| into |n><m| with weight c[k, n] * c[k, m],
+        where c are the coefficients given by kraus_coefficients, so each
+        term is a shifted slice of rho along the indices of the lossy mode.
+        """
+        n = len(self.dims)
+        rho = np.moveaxis(rho, (self.mode, n + self.mode), (0, 1))
+        final_state = np.zeros(rho.shape, dtype = np.result_type(rho, self.coefficients))
+        d = rho.shape[0]
+        extra_indices = (1,) * (rho.ndim - 2)
+        for k in range(d):
+            c = self.coefficients[k, :d-k]
+            weights = np.multiply.outer(c, c).reshape((d - k, d - k) + extra_indices)
+            final_state[:d-k, :d-k] += weights * rho[k:, k:]
+        return np.moveaxis(final_state, (0, 1), (self.mode, n + self.mode))
+
+    @classmethod
+    def is_pure(cls, state):
+        """
+        Return True iff the state is pure, see InputOutputRelation.is_pure
+        """
+        return not state.dims[0] == state.dims[1]
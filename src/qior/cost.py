@@ -0,0 +1,209 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT 
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or 
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along 
+# with qior. If not, see <https://www.gnu.org/licenses/>. 
+"""
+Dry-run estimates of the cost of evolving states with input-output
+relations, computed from the dims alone, without allocating anything.
+
+The evolution strategies are:
+    - "qobj": InputOutputRelation.evolve on a qp.Qobj, which builds the
+      global unitary self.U as a sparse matrix and multiplies by it
+    - "array": InputOutputRelation.evolve on a numpy array, see
+      evolve_array, which only uses the local unitary of the two modes
+    - "sparse": InputOutputRelation.evolve on a qior.SparseState, only for
+      kets, whose cost depends on the number of non-zero amplitudes of the
+      initial state instead of on the size of the system
+
+The estimates are upper bounds of the leading terms: the number of
+non-zero elements of the operator stored, the peak memory in bytes while
+building the relation and evolving one state, and the number of floating
+point operations of one evolution.
+"""
+import collections
+import math
+
+import numpy as np
+
+from . import InputOutputRelation
+
+Estimate = collections.namedtuple("Estimate", ["strategy", "nnz", "peak_bytes", "flops"])
+
+STATE_KINDS = ("ket", "dm")
+
+INDEX_BYTES = 8 # int64 indices, both in qutip CSR matrices and index maps
+
+# numpy casts between dtypes through buffers of 8192 elements, at most two
+# of them of complex128 at a time
+CAST_BUFFER_BYTES = 2 * 8192 * 16
+
+def estimate(dims, acting_on = (0, 1), state_kind = "ket", precision = "double",
+             real = False, strategy = None, memory_budget = None, support = None,
+             state_dtype = None):
+    """
+    Return the estimated cost of evolving a state with a relation.
+
+    Arguments:
+        - dims, acting_on, precision: as in InputOutputRelation.__init__
+
+        - state_kind: "ket" or "dm", for density matrices.
+
+        - real: whether both the relation and the state are real, see
+          InputOutputRelation.is_real.
+
+        - strategy: None to return a dictionary mapping the name of each
+          strategy to its Estimate, the name of a strategy to return only
+          its Estimate, or "auto" to return the Estimate of the strategy
+          with fewer floating point operations whose peak memory does not
+          exceed "memory_budget" bytes.
+
+        - memory_budget: the memory available in bytes, only used with the
+          "auto" strategy. None means unlimited.
+
+        - support: the number of number states with non-zero amplitude in
+          the initial state. The "sparse" strategy is only estimated for
+          kets when it is given.
+
+        - state_dtype: the numpy dtype of the initial state of the "array"
+          strategy. None means the dtype in which it is evolved, see
+          InputOutputRelation.array_dtype; other dtypes need extra buffers
+          to cast the state.
+    """
+    if state_kind not in STATE_KINDS:
+        raise ValueError("state_kind must be one of %s" % (STATE_KINDS,))
+    estimates = {
+        "qobj": qobj_estimate(dims, acting_on, state_kind),
+        "array": array_estimate(dims, acting_on, state_kind, precision, real, state_dtype),
+    }
+    if state_kind == "ket" and support is not None:
+        estimates["sparse"] = sparse_estimate(dims, acting_on, precision, real, support)
+    if strategy is None:
+        return estimates
+    if strategy == "auto":
+        return select_strategy(estimates, memory_budget)
+    if strategy not in estimates:
+        raise ValueError("unknown strategy %s, choose among %s" % (strategy, tuple(estimates) + ("auto",)))
+    return estimates[strategy]
+
+def select_strategy(estimates, memory_budget = None):
+    """
+    Return the Estimate in the dictionary "estimates" with fewer floating
+    point operations among those that fit in "memory_budget" bytes.
+    """
+    fitting = [e for e in estimates.values()
+               if memory_budget is None or e.peak_bytes <= memory_budget]
+    if not fitting:
+        cheapest = min(e.peak_bytes for e in estimates.values())
+        raise MemoryError("no strategy fits in %d bytes, the cheapest needs %d" % (memory_budget, cheapest))
+    return min(fitting, key = lambda e: (e.flops, e.peak_bytes))
+
+def local_nnz(d1, d2):
+    """
+    Return the number of elements of the local unitary of two modes with
+    dimensions d1 and d2 that may be non-zero. The number state |n1, n2>
+    maps to the number states |m1, m2> with m1 + m2 = n1 + n2 within the
+    cutoffs.
+    """
+    nnz = 0
+    for n1 in range(d1):
+        for n2 in range(d2):
+            N = n1 + n2
+            nnz += min(N, d1 - 1) - max(0, N - d2 + 1) + 1
+    return nnz
+
+def sizes(dims, acting_on):
+    """
+    Return the size of the system and the size of the two modes acted on
+    """
+    return math.prod(dims), dims[acting_on[0]] * dims[acting_on[1]]
+
+def index_bytes(dims, acting_on):
+    """
+    Return the bytes of the index maps shared by the relations with these
+    dims, see qior.fock.FockIndex
+    """
+    D, _ = sizes(dims, acting_on)
+    return INDEX_BYTES * D * (len(dims) + 1)
+
+def qobj_estimate(dims, acting_on, state_kind):
+    D, L = sizes(dims, acting_on)
+    item = 16 # qutip always stores complex128
+    nnz = local_nnz(dims[acting_on[0]], dims[acting_on[1]]) * (D // L)
+    csr = nnz * (item + INDEX_BYTES) + (D + 1) * INDEX_BYTES
+    # building self.U: coordinates, scipy matrix and its copy in qutip
+    build = nnz * (item + 2 * INDEX_BYTES) + 2 * csr
+    if state_kind == "ket":
+        # input, output and the probabilities of the cutoff check
+        evolution = csr + 3 * D * item
+        flops = 8 * nnz
+    else:
+        # input, U rho, U rho U^dagger and the adjoint U^dagger
+        evolution = 2 * csr + 3 * D * D * item
+        flops = 2 * 8 * nnz * D
+    peak = max(build, evolution) + index_bytes(dims, acting_on)
+    return Estimate("qobj", nnz, peak, flops)
+
+def array_dtype(precision, real, state_dtype):
+    """
+    Return the numpy dtype in which states are evolved, as
+    InputOutputRelation.array_dtype does
+    """
+    real_dtype, complex_dtype = InputOutputRelation.precisions[precision]
+    if real and (state_dtype is None or not np.issubdtype(state_dtype, np.complexfloating)):
+        return np.dtype(real_dtype)
+    return np.dtype(complex_dtype)
+
+def array_estimate(dims, acting_on, state_kind, precision, real, state_dtype = None):
+    D, L = sizes(dims, acting_on)
+    dtype = array_dtype(precision, real, state_dtype)
+    state_dtype = dtype if state_dtype is None else np.dtype(state_dtype)
+    item = dtype.itemsize
+    multiply_add = 2 if dtype.kind == "f" else 8
+    nnz = L * L # the local unitary is stored dense
+    # the cutoff check uses support and photon numbers buffers
+    check = (1 + INDEX_BYTES) * D
+    if state_kind == "ket":
+        size = D
+        # gathered amplitudes and their product for the rows
+        buffers = 2
+        # the local unitary and its copy cast to the dtype of the state
+        unitaries = 2 * nnz * item
+        flops = multiply_add * L * D
+    else:
+        size = D * D
+        # gathered amplitudes and their product for the rows and the columns
+        buffers = 4
+        # the local unitary, its conjugate and their cast copies
+        unitaries = 4 * nnz * item
+        flops = 2 * multiply_add * L * D * D
+    # input, output and the buffers of the workspace
+    evolution = size * (state_dtype.itemsize + (1 + buffers) * item)
+    if not state_dtype == dtype:
+        # the rows are gathered in the dtype of the state before casting them
+        evolution += size * state_dtype.itemsize
+    peak = evolution + check + unitaries + CAST_BUFFER_BYTES + index_bytes(dims, acting_on)
+    return Estimate("array", nnz, peak, flops)
+
+# approximate bytes of each entry of a SparseState: the dictionary slot, the
+# tuple of photon numbers, one small integer object per mode, and the amplitude
+SPARSE_ENTRY_BYTES = 104
+SPARSE_MODE_BYTES = 36
+
+def sparse_estimate(dims, acting_on, precision, real, support):
+    d1, d2 = dims[acting_on[0]], dims[acting_on[1]]
+    item = {"double": 8, "single": 4}[precision] * (1 if real else 2)
+    multiply_add = 2 if real else 8
+    # each number state reaches at most min(d1, d2) number states
+    reachable = support * min(d1, d2)
+    entry = SPARSE_ENTRY_BYTES + SPARSE_MODE_BYTES * len(dims)
+    nnz = d1 * d2 * d1 * d2
+    peak = (support + reachable) * entry + nnz * item
+    return Estimate("sparse", nnz, peak, multiply_add * reachable)
@@ -14,10 +14,6 @@
 """
 
 import qutip as qp
-from matplotlib import pyplot as plt
-from matplotlib.animation import FuncAnimation
-
-import qior
 
 from qior.example.utils import *
 
@@ -45,26 +41,14 @@ def main():
     # create a tuple containing different values of the reflectivity
     Rs = linspace(start = 0, end = 1, steps = 20)
 
-    # make an empty figure with two subplots
-    fig = prepare_input_output_figure()
-
-    # make a function that plots the tomography of the input and output
-    # density matrix on each subplot of that figure
-    def frame_update(frame_index):
-        r = Rs[frame_index]
-        dims = tuple(input.dims[0])
-        relation = qior.with_reflectivity(r, dims)
-        output = relation(input)
-        plot_input_tomography(input, fig)
-        plot_output_tomography(output, fig, r)
+    # compute the output state for each of those values of the reflectivity
+    outputs = sweep_reflectivity(input, Rs, dims)
 
-    # make an animation using that function and all the values of Rs
-    # (first, some optional arguments for finetuning the animation)
-    kw = dict(frames = len(Rs), interval = 2000/len(Rs))
-    # Now run the animation
-    animation = FuncAnimation(fig, frame_update, **kw)
-    # and save it
-    animation.save("qior-example1.mp4")
+    # make an animation whose frames plot the tomography of the input and
+    # output density matrices side by side, one frame per value of Rs. The
+    # frames are drawn in parallel and the animation lasts two seconds
+    render_tomography_animation("qior-example1.mp4", input, outputs, Rs,
+        fps = len(Rs)/2)
 
 if __name__ == "__main__":
     main()
@@ -15,7 +15,6 @@
 
 import qutip as qp
 from matplotlib import pyplot as plt
-from matplotlib.animation import FuncAnimation
 
 import qior
 from qior.example.utils import *
@@ -43,21 +42,12 @@ def main():
     input = psi*psi.dag()
     Rs = linspace(start = 0, end = 1, steps = 20)
 
-    # prepare the figure
-    fig = prepare_input_output_figure()
+    # compute the output state of each frame of the animation
+    outputs = sweep_reflectivity(input, Rs, dims, acting_on = (0, 1))
 
-    # create a function that, in turn, creates each frame for the animation
-    def frame_update(frame):
-        r = Rs[frame]
-        relation = qior.with_reflectivity(r, dims, acting_on = (0, 1))
-        output = relation(input)
-        plot_input_tomography(input, fig)
-        plot_output_tomography(output, fig, r)
-
-    # run the animation and save it to disk
-    kw = dict(frames = len(Rs), interval = 2000/len(Rs))
-    animation = FuncAnimation(fig, frame_update, **kw)
-    animation.save("qior-example2.mp4")
+    # render the animation and save it to disk
+    render_tomography_animation("qior-example2.mp4", input, outputs, Rs,
+        fps = len(Rs)/2)
 
     # now it is time for the static figure
     r = 0.5
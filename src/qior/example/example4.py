@@ -15,7 +15,6 @@
 import qutip as qp
 import qior
 from matplotlib import pyplot as plt
-from matplotlib.animation import FuncAnimation
 
 from qior.example.utils import *
 
@@ -47,23 +46,12 @@ def main():
     input = psi*psi.dag()
     Rs = linspace(start = 0, end = 1, steps = 30)
 
-    # prepare the figure
-    fig = prepare_input_output_figure()
-
-    # create a function that, in turn, creates each frame for the animation
-    def frame_update(frame):
-        r = Rs[frame]
-        relation = qior.with_reflectivity(r, dims, acting_on = (0, 1))
-        output = relation(input)
-        plot_input_tomography(input, fig, colorbar = frame_update.colorbar)
-        plot_output_tomography(output, fig, r, colorbar = frame_update.colorbar)
-        frame_update.colorbar = False
-    frame_update.colorbar = True
+    # compute the output state of each frame of the animation
+    outputs = sweep_reflectivity(input, Rs, dims, acting_on = (0, 1))
 
-    # run the animation and save it to disk
-    options = dict(frames = len(Rs), interval = 3000/len(Rs))
-    animation = FuncAnimation(fig, frame_update, **options)
-    animation.save("qior-example4.mp4")
+    # render the animation, three seconds long, and save it to disk
+    render_tomography_animation("qior-example4.mp4", input, outputs, Rs,
+        fps = len(Rs)/3, colorbar = True)
 
     # now it is time for the static figure
     r = 0.5
@@ -18,7 +18,6 @@ import numpy
 import qutip as qp
 import qior
 from matplotlib import pyplot as plt
-from matplotlib.animation import FuncAnimation
 
 from qior.example.utils import *
 
@@ -43,26 +42,14 @@ def main():
     relation1 = qior.with_reflectivity(.5, dims, acting_on = (0, 2))
     input = relation1(input) # the new input for future relations
 
-    # prepare a figure in which to draw an animation
-    fig = prepare_input_output_figure()
+    # compute the output state of each frame of the animation. These
+    # relations retain the coherences between the first and third modes in
+    # the input state, but create new ones with the second mode
+    outputs = sweep_reflectivity(input, Rs, dims, acting_on = (0, 1))
 
-    # create a function that, in turn, creates each frame for the animation
-    def frame_update(frame):
-        r = Rs[frame]
-        relation = qior.with_reflectivity(r, dims, acting_on = (0, 1))
-        # this relation retains the coherences between the first and third
-        # modes in the input state, but creates new ones with the second
-        # mode
-        output = relation(input)
-        plot_input_tomography(input, fig, colorbar = frame_update.colorbar)
-        plot_output_tomography(output, fig, r, colorbar = frame_update.colorbar)
-        frame_update.colorbar = False
-    frame_update.colorbar = True
-
-    # run the animation and save it to disk
-    options = dict(frames = len(Rs), interval = 3000/len(Rs))
-    animation = FuncAnimation(fig, frame_update, **options)
-    animation.save("qior-example6.mp4")
+    # render the animation, three seconds long, and save it to disk
+    render_tomography_animation("qior-example6.mp4", input, outputs, Rs,
+        fps = len(Rs)/3, colorbar = True)
 
 if __name__ == "__main__":
     main()
@@ -14,11 +14,18 @@
 This module does not add functionality to qior, but rather bundle some
 functions that are useful to run the examples.
 """
+import concurrent.futures
+import contextlib
 import itertools
+import subprocess
 
+import matplotlib
+import numpy as np
 import qutip as qp
 from matplotlib import pyplot as plt
 
+import qior
+
 def linspace(start, end, steps):
     delta = (end - start)/steps
     return tuple([start + i*delta for i in range(steps+1)])
@@ -81,3 +88,90 @@ def plot_fock_distribution(state, fig, ax = None):
     qp.plot_fock_distribution(state, fig = fig, ax = ax)
     ax.set_xticks(range(state.shape[0]), xlabels)
     ax.set_xlabel("Fock numbers")
+
+def sweep_reflectivity(input, reflectivities, dims, acting_on = (0, 1)):
+    """
+    Return a list with the output state for each of the reflectivities, so
+    that all the states of an animation are computed before rendering it.
+
+    The input state is converted to a numpy array once, and evolved as such
+    by every relation sharing the same qior.Workspace, so that the global
+    time evolution operator of each relation is never built.
+    """
+    array = np.ascontiguousarray(input.full())
+    workspace = qior.Workspace()
+    outputs = []
+    for r in reflectivities:
+        relation = qior.with_reflectivity(r, dims, acting_on)
+        output = relation.evolve(array, dims, workspace = workspace)
+        outputs.append(qp.Qobj(output, dims = input.dims))
+    return outputs
+
+def render_tomography_animation(filename, input, outputs, reflectivities, fps,
+                                colorbar = False, processes = None):
+    """
+    Write to "filename" a video whose frames show the tomography of the
+    input state next to that of each of the output states, as drawn by
+    plot_input_tomography and plot_output_tomography.
+
+    The frames are rendered in parallel, by a pool of "processes" processes
+    (by default, one per CPU) using a non-interactive backend, and piped in
+    order straight into ffmpeg, that encodes them at "fps" frames per second.
+    """
+    frames = [(input, output, r, colorbar) for output, r in zip(outputs, reflectivities)]
+    with concurrent.futures.ProcessPoolExecutor(processes,
+            initializer = use_non_interactive_backend) as pool:
+        write_video(filename, pool.map(render_tomography_frame, frames), fps)
+
+def use_non_interactive_backend():
+    matplotlib.use("Agg")
+
+def render_tomography_frame(frame):
+    """
+    Return a tuple with the width, height and RGBA pixels of the figure
+    showing the tomography of the input and output states in "frame"
+    """
+    input, output, reflectivity, colorbar = frame
+    fig = prepare_input_output_figure()
+    plot_input_tomography(input, fig, colorbar = colorbar)
+    plot_output_tomography(output, fig, reflectivity, colorbar = colorbar)
+    fig.canvas.draw()
+    pixels = np.asarray(fig.canvas.buffer_rgba())
+    plt.close(fig)
+    height, width, _ = pixels.shape
+    return width, height, pixels.tobytes()
+
+def write_video(filename, frames, fps):
+    """
+    Encode the frames, an iterable of tuples as returned by
+    render_tomography_frame, into the video file "filename" with ffmpeg,
+    as configured in matplotlib.rcParams["animation.ffmpeg_path"]
+    """
+    encoder = None
+    try:
+        for width, height, pixels in frames:
+            if encoder is None:
+                encoder = subprocess.Popen([
+                    matplotlib.rcParams["animation.ffmpeg_path"], "-y",
+                    "-loglevel", "error",
+                    "-f", "rawvideo", "-pix_fmt", "rgba",
+                    "-s", "%dx%d" % (width, height), "-r", str(fps),
+                    "-i", "-",
+                    "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                    "-vcodec", "h264", "-pix_fmt", "yuv420p",
+                    filename,
+                ], stdin = subprocess.PIPE)
+            encoder.stdin.write(pixels)
+        if encoder is None:
+            raise ValueError("a video needs at least one frame")
+        encoder.stdin.close()
+        if encoder.wait():
+            raise RuntimeError("ffmpeg failed to write %s" % filename)
+    except BaseException:
+        # do not leave ffmpeg running, waiting for frames that never come
+        if encoder is not None:
+            encoder.kill()
+            with contextlib.suppress(BrokenPipeError):
+                encoder.stdin.close()
+            encoder.wait()
+        raise
@@ -0,0 +1,94 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT 
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or 
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along 
+# with qior. If not, see <https://www.gnu.org/licenses/>. 
+"""
+Precomputed maps between the indices of the number states of a multimode
+system and the photon numbers of each mode.
+
+The number states of a system with cutoffs "dims" are indexed in the order
+of qp.tensor, the last mode changing fastest. Placing a local operator on
+two of the modes, projecting onto the photon numbers of a mode or applying
+a local unitary to a state then become integer gathers and scatters with
+the arrays computed here, instead of tensor products and permutations of
+qp.Qobj. These arrays only depend on the dims, so they are computed once
+per dims and shared by all the relations, see fock_index.
+"""
+import functools
+import math
+
+import numpy as np
+
+@functools.lru_cache(maxsize = None)
+def fock_index(dims):
+    """
+    Return the FockIndex of a system with the given dims, a tuple of
+    integers, computed once and shared by all the callers.
+    """
+    return FockIndex(dims)
+
+class FockIndex:
+    """
+    Index maps of the number states of a system with given dims. Its arrays
+    are shared, so they must not be modified. The pair maps are not flagged
+    as read-only only because numpy.take copies read-only indices.
+    """
+
+    def __init__(self, dims):
+        self.dims = tuple(int(D) for D in dims)
+        self.size = math.prod(self.dims)
+        self.pair_maps = dict()
+        self.sector_indices = None
+        occupations = np.indices(self.dims).reshape(len(self.dims), self.size)
+        occupations.flags.writeable = False
+        # occupations[i, g] is the photon number of mode i in the state g
+        self.occupations = occupations
+
+    def pair_map(self, acting_on):
+        """
+        Return an integer numpy array with shape (d1*d2, D/(d1*d2)), with d1
+        and d2 the dimensions of the modes in "acting_on", and D the size of
+        the system. Its element [n1*d2 + n2, r] is the index of the number
+        state with n1 and n2 photons in those modes, and the photon numbers
+        of the rest of the modes given by the index r, in the order of
+        self.dims.
+
+        That is, the rows of this array are the indices of the number states
+        of the two modes, as in the local operators of InputOutputRelation,
+        and each column is a copy of those two modes.
+        """
+        acting_on = tuple(acting_on)
+        if acting_on not in self.pair_maps:
+            a, b = acting_on
+            indices = np.arange(self.size).reshape(self.dims)
+            indices = np.moveaxis(indices, (a, b), (0, 1))
+            pair_map = np.ascontiguousarray(indices.reshape(self.dims[a] * self.dims[b], -1))
+            self.pair_maps[acting_on] = pair_map
+        return self.pair_maps[acting_on]
+
+    def sectors(self):
+        """
+        Return a list whose N-th element is the numpy array of the indices of
+        the number states with N photons in total.
+        """
+        if self.sector_indices is None:
+            total = self.occupations.sum(axis = 0)
+            self.sector_indices = [np.flatnonzero(total == N) for N in range(total.max() + 1)]
+        return self.sector_indices
+
+    def max_number_of_photons(self, probabilities, subsystem):
+        """
+        Return the highest photon number of "subsystem" among the number
+        states with non-zero probability, given a numpy array with the
+        probability of each number state.
+        """
+        photons = self.occupations[subsystem][probabilities != 0]
+        return int(photons.max()) if len(photons) else 0
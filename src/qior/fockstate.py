@@ -0,0 +1,133 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT 
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or 
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along 
+# with qior. If not, see <https://www.gnu.org/licenses/>. 
+"""
+Pure states stored as a map from the photon numbers of each mode to the
+amplitude of that number state.
+
+Typical input states, such as number states, have a handful of non-zero
+amplitudes among the prod(dims) number states of the system. Since
+input-output relations conserve the number of photons of the two modes
+they act on, each of those amplitudes only reaches the number states
+with the same total number of photons in those two modes. Evolving a
+SparseState only touches those, so its cost scales with the number of
+reachable number states instead of with prod(dims).
+"""
+import numpy as np
+import qutip as qp
+
+from .fock import fock_index
+
+class SparseState:
+    """
+    Ket stored as a dictionary mapping tuples with the photon number of
+    each mode, in the order of "dims", to the amplitude of that number
+    state. Number states not in the dictionary have null amplitude.
+    """
+
+    def __init__(self, amplitudes, dims):
+        """
+        Initialize a sparse state from the dictionary "amplitudes" and the
+        cutoffs of each mode, "dims", as in InputOutputRelation.__init__
+        """
+        self.dims = tuple(int(D) for D in dims)
+        self.amplitudes = dict()
+        for occupation, amplitude in amplitudes.items():
+            occupation = tuple(int(n) for n in occupation)
+            if not len(occupation) == len(self.dims):
+                raise ValueError("each occupation must contain one photon number per mode")
+            if any(n < 0 or D <= n for n, D in zip(occupation, self.dims)):
+                raise ValueError("the occupation %s is outside the cutoffs %s" % (occupation, self.dims))
+            if amplitude:
+                self.amplitudes[occupation] = amplitude
+
+    @classmethod
+    def number_state(cls, occupation, dims):
+        """
+        Return the number state with the photon numbers in "occupation"
+        """
+        return cls({tuple(occupation): 1}, dims)
+
+    @classmethod
+    def from_qobj(cls, state):
+        """
+        Return the sparse version of the qp.Qobj ket "state"
+        """
+        if state.dims[0] == state.dims[1]:
+            raise ValueError("only pure states can be stored as sparse states")
+        dims = tuple(int(D) for D in state.dims[0])
+        vector = state.full().ravel()
+        indices = np.flatnonzero(vector)
+        occupations = fock_index(dims).occupations[:, indices].T
+        return cls(dict(zip(map(tuple, occupations), vector[indices])), dims)
+
+    def to_qobj(self):
+        """
+        Return this state as a qp.Qobj ket
+        """
+        vector = np.zeros(fock_index(self.dims).size, dtype = complex)
+        if self.amplitudes:
+            occupations = np.array(list(self.amplitudes)).T
+            vector[np.ravel_multi_index(occupations, self.dims)] = list(self.amplitudes.values())
+        return qp.Qobj(vector.reshape(-1, 1), dims = [list(self.dims), [1] * len(self.dims)])
+
+    def __len__(self):
+        """
+        Return the number of number states with non-zero amplitude
+        """
+        return len(self.amplitudes)
+
+    def prune(self, tolerance):
+        """
+        Return a copy of this state without the amplitudes whose magnitude is
+        not larger than "tolerance", such as those that interfere
+        destructively up to rounding errors.
+        """
+        return SparseState({occupation: amplitude
+            for occupation, amplitude in self.amplitudes.items()
+            if abs(amplitude) > tolerance}, self.dims)
+
+    def evolve(self, relation):
+        """
+        Return the SparseState resulting from applying "relation", an
+        InputOutputRelation, to this state.
+
+        Each number state with n1 and n2 photons in the two modes the
+        relation acts on is mapped, with the coefficients of the local
+        unitary, to the number states with m1 + m2 = n1 + n2 photons in those
+        modes and the same photons in the rest. If that total exceeds any of
+        the two cutoffs an exception is thrown, since the output state would
+        leak outside of them.
+        """
+        if not tuple(relation.dims) == self.dims:
+            raise ValueError("the dims of the state %s do not match the dims of the relation %s" % (self.dims, tuple(relation.dims)))
+        a, b = relation.acting_on
+        d1, d2 = relation.local_dims()
+        U = relation.local_unitary_array()
+        amplitudes = dict()
+        for occupation, amplitude in self.amplitudes.items():
+            n1, n2 = occupation[a], occupation[b]
+            N = n1 + n2
+            if N >= d1 or N >= d2:
+                raise ValueError(("given the input output relation %s and its" + \
+                " cutoffs %s, the output state is not contained within those " + \
+                "cutoffs") % (relation, list(self.dims)))
+            column = U[:, n1*d2 + n2]
+            output = list(occupation)
+            for m1 in range(N + 1):
+                coefficient = column[m1*d2 + N - m1]
+                if not coefficient:
+                    continue
+                output[a], output[b] = m1, N - m1
+                key = tuple(output)
+                amplitudes[key] = amplitudes.get(key, 0) + coefficient * amplitude
+        return SparseState(amplitudes, self.dims)
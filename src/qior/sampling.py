@@ -0,0 +1,167 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT 
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or 
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along 
+# with qior. If not, see <https://www.gnu.org/licenses/>. 
+"""
+Direct sampling of the photon numbers measured on the output modes of
+input-output relations.
+
+Evaluating the output density matrix with InputOutputRelation.evolve and
+sampling from its diagonal requires the whole Fock space of the modes. The
+functions in this module only use the coefficients of the relations, that
+is, InputOutputRelation.matrix, and the photon numbers of the input modes.
+Output modes are sampled one photon at a time from conditional marginal
+distributions following the algorithm B of P. Clifford and R. Clifford,
+"The Classical Complexity of Boson Sampling", SODA 2018, pp. 146-155.
+"""
+import numpy as np
+
+def sample(relations, occupation, size = 1, rng = None):
+    """
+    Return a numpy array of integers with shape (size, len(occupation)) in
+    which each row is a sample of the photon numbers measured on each of the
+    output modes after applying "relations" to the number state whose photon
+    numbers are given by "occupation".
+
+    Arguments:
+        - relations: an InputOutputRelation or an iterable of them, applied
+          in the given order, that is, relations[0] acts first. All of them
+          must act on systems with the same number of modes.
+
+        - occupation: an iterable of integers with the photon number of each
+          input mode, in the order prescribed by the "dims" argument of the
+          relations.
+
+        - size: the number of samples to draw. They are drawn in batches,
+          all the samples of a batch at once, one photon at a time.
+
+        - rng: a seed or a numpy.random.Generator, passed through
+          numpy.random.default_rng.
+
+    The cutoffs in the "dims" argument of the relations are not used: the
+    samples are drawn as if the Fock spaces of the modes were infinite.
+    """
+    matrix = mode_matrix_of(relations)
+    occupation = tuple(occupation)
+    if not len(occupation) == matrix.shape[0]:
+        raise ValueError("the occupation must contain one photon number per mode of the relations")
+    if any(n < 0 for n in occupation):
+        raise ValueError("photon numbers must be non-negative")
+
+    rng = np.random.default_rng(rng)
+    modes = [mode for mode, n in enumerate(occupation) for _ in range(n)]
+    samples = np.zeros((size, len(occupation)), dtype = int)
+    if not modes:
+        return samples # vacuum maps to vacuum
+
+    photons = sample_photon_modes(matrix[modes, :].T, size, rng)
+    np.add.at(samples, (np.arange(size)[:, None], photons), 1)
+    return samples
+
+def mode_matrix_of(relations):
+    """
+    Return the matrix with the coefficients of the input-output relation
+    resulting from applying "relations" in order, see sample.__doc__
+    """
+    if hasattr(relations, "mode_matrix"):
+        relations = (relations,)
+    matrix = None
+    for relation in relations:
+        if matrix is None:
+            matrix = relation.mode_matrix()
+        elif not len(relation.dims) == matrix.shape[0]:
+            raise ValueError("all the relations must act on the same number of modes")
+        else:
+            # a_i -> sum_j matrix[i, j] b_j, and b_j -> sum_k M[j, k] c_k
+            matrix = matrix @ relation.mode_matrix()
+    if matrix is None:
+        raise ValueError("at least one relation is needed to sample its output")
+    return matrix
+
+def sample_photon_modes(A, size, rng, batch = 1024):
+    """
+    Return an integer numpy array with shape (size, n) with the output mode
+    of each of the n photons in "size" samples, where A[j, k] is the
+    amplitude of the k-th input photon ending up in the output mode j.
+
+    The samples are drawn in batches of at most "batch" samples, so that the
+    memory used does not grow with "size".
+    """
+    photons = np.empty((size, A.shape[1]), dtype = int)
+    for start in range(0, size, batch):
+        stop = min(start + batch, size)
+        photons[start:stop] = sample_batch(A, stop - start, rng)
+    return photons
+
+def sample_batch(A, size, rng):
+    """
+    Return the output modes of the photons in "size" samples, as in
+    sample_photon_modes, drawn all at once.
+    """
+    m, n = A.shape
+    # the algorithm requires a uniformly random order of the input photons
+    order = rng.permuted(np.tile(np.arange(n), (size, 1)), axis = 1)
+    A = np.moveaxis(A[:, order], 1, 0) # A[s, j, k] for the sample s
+    photons = np.empty((size, n), dtype = int)
+    photons[:, 0] = draw(abs(A[:, :, 0])**2, rng)
+    for k in range(1, n):
+        columns = A[:, :, :k+1]
+        rows = np.take_along_axis(columns, photons[:, :k, None], axis = 1)
+        # Laplace expansion of the permanent along the row of the new photon
+        amplitudes = np.einsum("sjl,sl->sj", columns, permanent_minors(rows))
+        photons[:, k] = draw(abs(amplitudes)**2, rng)
+    return photons
+
+def permanent_minors(rows):
+    """
+    Return a numpy array with shape (..., k+1) whose element l is the
+    permanent of the matrix "rows", with shape (..., k, k+1), without its
+    column l.
+
+    All the minors are computed at once with Glynn's formula: the sums of
+    the rows weighted with the signs delta are updated in Gray code order,
+    one row at a time, and for each delta the products of all those sums
+    but one are taken from prefix and suffix products.
+    """
+    k = rows.shape[-2]
+    sums = rows.sum(axis = -2) # all the signs are +1 at first
+    minors = np.zeros(sums.shape, dtype = complex)
+    delta = np.ones(k, dtype = int)
+    sign = 1
+    for g in range(2**(k-1) if k else 1):
+        if g:
+            i = (g & -g).bit_length() # the sign of the first row is fixed
+            delta[i] = -delta[i]
+            sums += 2 * delta[i] * rows[..., i, :]
+            sign = -sign
+        minors += sign * products_but_one(sums)
+    return minors / 2**max(k-1, 0)
+
+def products_but_one(factors):
+    """
+    Return a numpy array whose element l along the last axis is the product
+    of all the elements of "factors" along that axis except the l-th one
+    """
+    prefix = np.ones_like(factors)
+    suffix = np.ones_like(factors)
+    np.cumprod(factors[..., :-1], axis = -1, out = prefix[..., 1:])
+    np.cumprod(factors[..., :0:-1], axis = -1, out = suffix[..., -2::-1])
+    return prefix * suffix
+
+def draw(weights, rng):
+    """
+    Return, for each row of the non-negative "weights" array, an index drawn
+    with probabilities proportional to the weights in that row.
+    """
+    cumulative = np.cumsum(weights, axis = 1)
+    thresholds = rng.random(weights.shape[0]) * cumulative[:, -1]
+    indices = (cumulative <= thresholds[:, None]).sum(axis = 1)
+    return np.minimum(indices, weights.shape[1] - 1)
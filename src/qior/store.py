@@ -0,0 +1,319 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT 
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or 
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along 
+# with qior. If not, see <https://www.gnu.org/licenses/>. 
+"""
+Streaming storage of the output states of large scans.
+
+Scans over reflectivities and input states may produce more output states
+than fit in memory. The ScanWriter in this module evaluates the scan points
+one by one and writes the requested quantities of each output state to a
+directory on disk, in compressed chunks of a fixed number of points, as
+soon as each chunk is complete. If the scan is interrupted, opening a
+ScanWriter on the same directory resumes it after the last point written.
+The ScanReader loads the chunks lazily, only when the points they contain
+are accessed, and decompresses only the quantities that are read.
+
+The quantities that can be stored for each output state are:
+    - "state": the full ket or density matrix as a numpy array
+    - "diagonal": the probabilities of each number state
+    - "blocks": the blocks of the state restricted to the number states
+      with the same total number of photons, stored as "blocks-N" with N
+      that total number of photons
+    - "reduced": the density matrix of the subsystems given by the "keep"
+      argument, with the rest traced out
+"""
+import json
+import os
+
+import numpy as np
+
+from .fock import fock_index
+
+QUANTITIES = ("state", "diagonal", "blocks", "reduced")
+
+MANIFEST = "scan.json"
+
+def write_scan(path, points, evaluate, quantities = ("state",), keep = None, chunk_size = 256):
+    """
+    Store in the directory "path" the quantities of the output state
+    evaluate(point) for each point in the iterable "points", which may be a
+    generator, and return a ScanReader for that directory. If the directory
+    already contains the first points of the same scan, those are skipped.
+    See ScanWriter.__init__ for the rest of the arguments.
+    """
+    with ScanWriter(path, quantities, keep, chunk_size) as writer:
+        writer.extend(points, evaluate)
+    return ScanReader(path)
+
+class ScanWriter:
+    """
+    Writer of the output states of a scan into compressed chunks on disk,
+    see the docstring of this module.
+    """
+
+    def __init__(self, path, quantities = ("state",), keep = None, chunk_size = 256):
+        """
+        Open the directory "path" for writing, creating it if needed.
+
+        Arguments:
+            - quantities: an iterable with the names of the quantities to
+              store for each state, see the docstring of this module.
+
+            - keep: an iterable of the indices of the subsystems whose
+              reduced state is stored when "reduced" is one of the
+              quantities.
+
+            - chunk_size: the number of points stored in each file.
+
+        If the directory contains a scan already, the arguments must match
+        those it was written with, and new states are appended after the
+        ones it contains.
+        """
+        quantities = list(quantities)
+        for quantity in quantities:
+            if quantity not in QUANTITIES:
+                raise ValueError("unknown quantity %s, choose among %s" % (quantity, QUANTITIES))
+        if "reduced" in quantities and keep is None:
+            raise ValueError("the subsystems to keep are needed to store reduced states")
+        if chunk_size < 1:
+            raise ValueError("chunks must contain at least one point")
+
+        self.path = path
+        self.manifest = dict(
+            quantities = quantities,
+            keep = None if keep is None else list(keep),
+            chunk_size = chunk_size,
+            dims = None,
+            chunks = [],
+        )
+        os.makedirs(path, exist_ok = True)
+        if os.path.exists(self.manifest_path()):
+            self.resume()
+        self.buffer = dict()
+        self.buffered = 0
+        if self.manifest["chunks"] and self.manifest["chunks"][-1] < chunk_size:
+            self.reload_last_chunk()
+
+    def resume(self):
+        """
+        Load the manifest of the scan already in self.path after checking it
+        was written with the same arguments.
+        """
+        with open(self.manifest_path()) as f:
+            manifest = json.load(f)
+        for key in ("quantities", "keep", "chunk_size"):
+            if not manifest[key] == self.manifest[key]:
+                raise ValueError("the scan in %s was written with %s = %s, not %s" % (self.path, key, manifest[key], self.manifest[key]))
+        self.manifest = manifest
+
+    def reload_last_chunk(self):
+        """
+        Load the last chunk, which is not full, into the buffer so that the
+        next states are appended to it.
+        """
+        self.buffered = self.manifest["chunks"].pop()
+        chunk = self.chunk_path(len(self.manifest["chunks"]))
+        with np.load(chunk) as data:
+            for key in data.files:
+                self.buffer[key] = list(data[key])
+
+    def __len__(self):
+        """
+        Return the number of states stored so far
+        """
+        return sum(self.manifest["chunks"]) + self.buffered
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def extend(self, points, evaluate):
+        """
+        Append evaluate(point) for each point in the iterable "points",
+        skipping the first len(self) points, that were already stored.
+        """
+        skip = len(self)
+        for i, point in enumerate(points):
+            if i < skip:
+                continue
+            self.append(evaluate(point))
+
+    def append(self, state):
+        """
+        Append the quantities of the qp.Qobj "state" to the scan, writing a
+        chunk to disk when it is full.
+        """
+        dims = [int(D) for D in state.dims[0]]
+        if self.manifest["dims"] is None:
+            self.manifest["dims"] = dims
+        elif not self.manifest["dims"] == dims:
+            raise ValueError("all the states in a scan must have the same dims")
+        for key, array in self.quantities_of(state).items():
+            self.buffer.setdefault(key, []).append(array)
+        self.buffered += 1
+        if self.buffered == self.manifest["chunk_size"]:
+            self.flush()
+
+    def quantities_of(self, state):
+        """
+        Return a dictionary mapping the names of the arrays to store for
+        "state" to those arrays.
+        """
+        quantities = self.manifest["quantities"]
+        pure = not state.dims[0] == state.dims[1]
+        stored = dict()
+        # a density matrix is only made dense if it is stored whole or in blocks
+        if "state" in quantities or "blocks" in quantities:
+            array = state.full()
+        if "state" in quantities:
+            stored["state"] = array
+        if "diagonal" in quantities:
+            if pure:
+                stored["diagonal"] = abs(state.full().ravel())**2
+            else:
+                stored["diagonal"] = state.diag().real
+        if "blocks" in quantities:
+            dims = tuple(int(D) for D in state.dims[0])
+            for N, indices in enumerate(fock_index(dims).sectors()):
+                if pure:
+                    stored["blocks-%d" % N] = array[indices, 0]
+                else:
+                    stored["blocks-%d" % N] = array[np.ix_(indices, indices)]
+        if "reduced" in quantities:
+            stored["reduced"] = state.ptrace(self.manifest["keep"]).full()
+        return stored
+
+    def flush(self):
+        """
+        Write the buffered states to disk as a new chunk
+        """
+        if not self.buffered:
+            return
+        chunk = self.chunk_path(len(self.manifest["chunks"]))
+        arrays = {key: np.stack(values) for key, values in self.buffer.items()}
+        with open(chunk + ".tmp", "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(chunk + ".tmp", chunk)
+        self.manifest["chunks"].append(self.buffered)
+        self.write_manifest()
+        if self.buffered == self.manifest["chunk_size"]:
+            self.buffer = dict()
+            self.buffered = 0
+        else:
+            # a partial chunk is rewritten once it gets more states
+            self.manifest["chunks"].pop()
+
+    def close(self):
+        """
+        Write the states that do not fill a whole chunk to disk
+        """
+        self.flush()
+
+    def write_manifest(self):
+        with open(self.manifest_path() + ".tmp", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(self.manifest_path() + ".tmp", self.manifest_path())
+
+    def manifest_path(self):
+        return os.path.join(self.path, MANIFEST)
+
+    def chunk_path(self, index):
+        return os.path.join(self.path, "chunk-%08d.npz" % index)
+
+class ScanReader:
+    """
+    Lazy reader of a scan written by ScanWriter. Indexing it with an integer
+    returns a dictionary mapping the names of the stored arrays to their
+    values for that point of the scan, and the method read returns only
+    some of them. Only the chunk containing that point is opened, and only
+    the arrays that are read are decompressed from it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.loaded_index = None
+        self.loaded_file = None
+        self.loaded_chunk = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def dims(self):
+        return self.manifest["dims"]
+
+    @property
+    def quantities(self):
+        return self.manifest["quantities"]
+
+    def __len__(self):
+        return sum(self.manifest["chunks"])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        return self.read(i)
+
+    def read(self, i, keys = None):
+        """
+        Return a dictionary with the arrays stored for the point "i" of the
+        scan whose names are in "keys", or all of them if it is None. The
+        name "blocks" stands for all the stored "blocks-N" arrays.
+        """
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("scan index out of range")
+        chunk_size = self.manifest["chunk_size"]
+        chunk = self.load_chunk(i // chunk_size, keys)
+        return {key: values[i % chunk_size] for key, values in chunk.items()}
+
+    def load_chunk(self, index, keys = None):
+        """
+        Return a dictionary with the arrays stored in the chunk "index" whose
+        names are in "keys", or all of them if it is None. The last chunk
+        opened is kept open, and the arrays already read from it in memory.
+        """
+        if not self.loaded_index == index:
+            self.close()
+            path = os.path.join(self.path, "chunk-%08d.npz" % index)
+            self.loaded_file = np.load(path)
+            self.loaded_index = index
+        files = self.loaded_file.files
+        if keys is None:
+            keys = files
+        else:
+            keys = [key for key in files if key in keys or \
+                    (key.startswith("blocks-") and "blocks" in keys)]
+        for key in keys:
+            if key not in self.loaded_chunk:
+                self.loaded_chunk[key] = self.loaded_file[key]
+        return {key: self.loaded_chunk[key] for key in keys}
+
+    def close(self):
+        """
+        Close the chunk kept open and release the arrays read from it
+        """
+        if self.loaded_file is not None:
+            self.loaded_file.close()
+        self.loaded_index = None
+        self.loaded_file = None
+        self.loaded_chunk = dict()
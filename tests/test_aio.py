@@ -0,0 +1,69 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along
+# with qior. If not, see <https://www.gnu.org/licenses/>.
+"""
+Asyncio front-end: shared constructions, bounded queue and shutdown.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+import qutip as qp
+
+import qior
+
+dims = (3, 3)
+
+def input_state():
+    return qp.tensor(qp.basis(3, 1), qp.basis(3, 0))
+
+def test_identical_relations_are_built_once():
+    builds = []
+    def builder(R):
+        builds.append(R)
+        time.sleep(.1) # long enough for every job to ask for the relation
+        return qior.InputOutputRelation.with_reflectivity(R, dims)
+
+    async def main():
+        async with qior.EvaluationService(workers = 8) as service:
+            return await asyncio.gather(*[
+                service.evaluate(builder, (.3,), input_state()) for _ in range(8)])
+
+    outputs = asyncio.run(main())
+    assert builds == [.3]
+    expected = qior.with_reflectivity(.3, dims)(input_state())
+    assert all((output - expected).norm() < 1e-12 for output in outputs)
+
+def test_submit_waits_when_the_queue_is_full():
+    release = threading.Event()
+    def builder(R):
+        release.wait()
+        return qior.InputOutputRelation.with_reflectivity(R, dims)
+
+    async def main():
+        service = qior.EvaluationService(workers = 1, max_pending = 2)
+        await service.start()
+        futures = [await service.submit(builder, (.3,), input_state())]
+        await asyncio.sleep(.05) # the only worker takes that job and blocks
+        for _ in range(2):
+            futures.append(await service.submit(builder, (.3,), input_state()))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(service.submit(builder, (.3,), input_state()), .1)
+        release.set()
+        await service.close()
+        return [future.result() for future in futures]
+
+    assert len(asyncio.run(main())) == 3
+
+def test_close_without_start():
+    asyncio.run(qior.EvaluationService().close())
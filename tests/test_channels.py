@@ -0,0 +1,59 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along
+# with qior. If not, see <https://www.gnu.org/licenses/>.
+"""
+Loss channels, compared with a relation with an environment mode that is
+traced out.
+"""
+import numpy as np
+import pytest
+import qutip as qp
+
+import qior
+
+dims = (3, 2, 3)
+eta = .35
+
+def with_environment(state, mode):
+    """
+    Return the output of the ancilla construction of the loss of "mode"
+    """
+    d = dims[mode]
+    environment = len(dims)
+    relation = qior.with_reflectivity(eta, dims + (d,), acting_on = (mode, environment))
+    if state.isket:
+        state = qp.tensor(state, qp.basis(d, 0))
+    else:
+        state = qp.tensor(state, qp.fock_dm(d, 0))
+    return relation(state).ptrace(list(range(len(dims))))
+
+def ket():
+    rng = np.random.default_rng(0)
+    amplitudes = rng.normal(size = 18) + 1j * rng.normal(size = 18)
+    return qp.Qobj(amplitudes / np.linalg.norm(amplitudes), dims = [list(dims), [1, 1, 1]])
+
+def density_matrix():
+    psi = ket()
+    return .6 * psi * psi.dag() + .4 * qp.tensor(*[qp.fock_dm(d, d - 1) for d in dims])
+
+@pytest.mark.parametrize("mode", range(len(dims)))
+@pytest.mark.parametrize("state", [ket, density_matrix])
+def test_matches_environment_mode(mode, state):
+    state = state()
+    expected = with_environment(state, mode)
+    channel = qior.with_loss(eta, dims, mode)
+    assert (channel(state) - expected).norm() < 1e-12
+
+    array = np.ascontiguousarray(state.full())
+    final_state = channel(array, dims = dims)
+    assert final_state.shape == (18, 18)
+    assert np.allclose(final_state, expected.full())
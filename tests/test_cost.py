@@ -0,0 +1,62 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along
+# with qior. If not, see <https://www.gnu.org/licenses/>.
+"""
+Estimates of the peak memory of evolving numpy arrays, compared with the
+memory traced while doing it.
+"""
+import math
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import qior
+from qior import fock
+
+dims = (4, 4, 4, 3)
+
+matrices = {
+    "real": np.array([[.6, .8], [.8, -.6]]),
+    "complex": np.array([[.6, .8j], [.8j, .6]]),
+}
+
+def traced_peak(state_kind, precision, matrix, state_dtype):
+    """
+    Return the peak memory traced while building a relation and evolving
+    a state, as an array, with it
+    """
+    qior.InputOutputRelation(matrix, (2, 2)).evolve(np.eye(4)[1]) # imports
+    fock.fock_index.cache_clear()
+    D = math.prod(dims)
+    tracemalloc.start()
+    relation = qior.InputOutputRelation(matrix, dims, precision = precision)
+    state = np.zeros(D if state_kind == "ket" else (D, D), dtype = state_dtype)
+    state.flat[0] = 1
+    relation.evolve(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+@pytest.mark.parametrize("state_dtype", [np.float64, np.complex128, np.float32])
+@pytest.mark.parametrize("matrix", list(matrices))
+@pytest.mark.parametrize("precision", ["double", "single"])
+@pytest.mark.parametrize("state_kind", ["ket", "dm"])
+def test_array_estimate_bounds_peak_memory(state_kind, precision, matrix, state_dtype):
+    peak = traced_peak(state_kind, precision, matrices[matrix], state_dtype)
+    real = matrix == "real" and not np.issubdtype(state_dtype, np.complexfloating)
+    estimate = qior.estimate(dims, state_kind = state_kind, precision = precision,
+        real = real, strategy = "array", state_dtype = state_dtype)
+    assert peak <= estimate.peak_bytes
+    if state_kind == "dm":
+        # the buffers the size of the state dominate, and are all counted
+        assert estimate.peak_bytes < 1.5 * peak
@@ -0,0 +1,80 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along
+# with qior. If not, see <https://www.gnu.org/licenses/>.
+"""
+Analytic derivatives of output states, compared with central differences.
+"""
+import numpy as np
+import pytest
+import qutip as qp
+
+import qior
+
+h = 1e-5
+tolerance = 1e-7
+
+def input_state(dims, mixed):
+    psi = (qp.tensor(*[qp.basis(d, 1 if i < 2 else 0) for i, d in enumerate(dims)]) +
+           qp.tensor(*[qp.basis(d, 0) for d in dims])).unit()
+    if mixed:
+        return .7 * psi * psi.dag() + .3 * qp.tensor(*[qp.fock_dm(d, 0) for d in dims])
+    return psi
+
+@pytest.mark.parametrize("mixed", [False, True])
+def test_reflectivity_derivative(mixed):
+    dims, R = (3, 3, 2), .3
+    state = input_state(dims, mixed)
+    relation = qior.with_reflectivity(R, dims)
+    dmatrix = qior.InputOutputRelation.reflectivity_matrix_derivative(R)
+    output, doutput = relation.evolve_with_derivative(state, dmatrix)
+    plus = qior.with_reflectivity(R + h, dims)(state)
+    minus = qior.with_reflectivity(R - h, dims)(state)
+    assert (output - relation(state)).norm() < 1e-12
+    assert ((plus - minus) / (2 * h) - doutput).norm() < tolerance
+
+@pytest.mark.parametrize("mixed", [False, True])
+def test_observable_derivative(mixed):
+    dims, R = (3, 3, 2), .6
+    state = input_state(dims, mixed)
+    observable = qp.tensor(qp.num(3), qp.qeye(3), qp.qeye(2))
+    dmatrix = qior.InputOutputRelation.reflectivity_matrix_derivative(R)
+    value, dvalue = qior.with_reflectivity(R, dims).evolve_with_derivative(
+        state, dmatrix, observable)
+    expect = lambda R: qp.expect(observable, qior.with_reflectivity(R, dims)(state))
+    assert value == pytest.approx(expect(R))
+    assert dvalue == pytest.approx((expect(R + h) - expect(R - h)) / (2 * h), abs = tolerance)
+
+def complex_matrix(theta):
+    c, s, phase = np.cos(theta), np.sin(theta), np.exp(1j * theta)
+    return np.array([[c * phase, 1j * s], [1j * s * phase, c]])
+
+def complex_matrix_derivative(theta):
+    c, s, phase = np.cos(theta), np.sin(theta), np.exp(1j * theta)
+    return np.array([[(-s + 1j * c) * phase, 1j * c],
+                     [1j * (c + 1j * s) * phase, -s]])
+
+@pytest.mark.parametrize("mixed", [False, True])
+def test_complex_derivative_on_reversed_modes(mixed):
+    dims, acting_on, theta = (3, 2, 3), (2, 0), .4
+    state = input_state(dims, mixed)
+    relation = qior.InputOutputRelation(complex_matrix(theta), dims, acting_on)
+    output, doutput = relation.evolve_with_derivative(
+        state, complex_matrix_derivative(theta))
+    evolve = lambda theta: qior.InputOutputRelation(
+        complex_matrix(theta), dims, acting_on)(state)
+    assert ((evolve(theta + h) - evolve(theta - h)) / (2 * h) - doutput).norm() < tolerance
+
+def test_numpy_states_are_rejected():
+    relation = qior.with_reflectivity(.5, (2, 2))
+    dmatrix = qior.InputOutputRelation.reflectivity_matrix_derivative(.5)
+    with pytest.raises(ValueError):
+        relation.evolve_with_derivative(np.eye(4)[1], dmatrix)
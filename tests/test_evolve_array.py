@@ -0,0 +1,97 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along
+# with qior. If not, see <https://www.gnu.org/licenses/>.
+"""
+Evolution of numpy arrays, compared with the evolution of the same states
+as qp.Qobj.
+"""
+import numpy as np
+import pytest
+import qutip as qp
+
+import qior
+
+dims = (3, 3, 2)
+D = 18
+
+matrices = {
+    "real": np.array([[.6, .8], [.8, -.6]]),
+    "complex": np.array([[.6, .8j], [.8j, .6]]),
+}
+
+tolerances = {"double": 1e-12, "single": 1e-6}
+
+def real_ket():
+    """
+    Return a real ket with at most one photon on each of the input modes,
+    so that the output does not leak outside the cutoffs.
+    """
+    ket = np.zeros(D)
+    ket[[0, 3, 7, 8, 9]] = [.1, .3, .5, .7, .4]
+    return ket / np.linalg.norm(ket)
+
+def states():
+    ket = real_ket()
+    complex_ket = ket * np.exp(1j * np.arange(D))
+    return {
+        "real ket": ket,
+        "complex ket": complex_ket,
+        "real density matrix": np.outer(ket, ket),
+        "complex density matrix": np.outer(complex_ket, complex_ket.conj()),
+    }
+
+def as_qobj(array):
+    if array.ndim == 1:
+        return qp.Qobj(array.reshape(D, 1), dims = [list(dims), [1, 1, 1]])
+    return qp.Qobj(array, dims = [list(dims), list(dims)])
+
+@pytest.mark.parametrize("precision", ["double", "single"])
+@pytest.mark.parametrize("matrix", list(matrices))
+@pytest.mark.parametrize("name", list(states()))
+def test_evolve_array_matches_qobj(name, matrix, precision):
+    state = states()[name]
+    relation = qior.InputOutputRelation(matrices[matrix], dims, precision = precision)
+    expected = relation.evolve(as_qobj(state)).full().reshape(state.shape)
+    final_state = relation.evolve(state)
+    assert final_state.dtype == relation.array_dtype(state.dtype)
+    assert np.allclose(final_state, expected, atol = tolerances[precision])
+
+@pytest.mark.parametrize("precision", ["double", "single"])
+@pytest.mark.parametrize("name", list(states()))
+def test_workspace_does_not_allocate_after_first_call(name, precision):
+    state = states()[name]
+    relation = qior.InputOutputRelation(matrices["complex"], dims, precision = precision)
+    expected = relation.evolve(as_qobj(state)).full().reshape(state.shape)
+    workspace = qior.Workspace()
+    out = np.empty(state.shape, dtype = complex)
+    relation.evolve(state, out = out, workspace = workspace)
+    allocations = workspace.allocations
+    for _ in range(3):
+        relation.evolve(state, out = out, workspace = workspace)
+    assert workspace.allocations == allocations
+    assert np.allclose(out, expected, atol = tolerances[precision])
+
+def test_integer_ket():
+    relation = qior.with_reflectivity(.5, dims)
+    ket = np.zeros(D, dtype = int)
+    ket[6] = 1 # one photon on the first mode
+    expected = relation.evolve(as_qobj(ket.astype(float))).full().ravel()
+    assert np.allclose(relation.evolve(ket), expected)
+
+@pytest.mark.parametrize("keyword", ["out", "workspace"])
+def test_buffers_are_rejected_for_other_states(keyword):
+    relation = qior.with_reflectivity(.5, dims)
+    buffers = {"out": np.empty((D, 1), dtype = complex), "workspace": qior.Workspace()}
+    ket = as_qobj(real_ket())
+    for state in (ket, qior.SparseState.from_qobj(ket)):
+        with pytest.raises(ValueError):
+            relation.evolve(state, **{keyword: buffers[keyword]})
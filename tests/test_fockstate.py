@@ -0,0 +1,71 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along
+# with qior. If not, see <https://www.gnu.org/licenses/>.
+"""
+Sparse kets, compared with the evolution of the same kets as qp.Qobj.
+"""
+import numpy as np
+import pytest
+import qutip as qp
+
+import qior
+
+dims = (4, 3, 4)
+
+def number_state(*occupation, dims = dims):
+    return qp.tensor(*[qp.basis(d, n) for d, n in zip(dims, occupation)])
+
+def relations():
+    matrix = np.array([[.6, .8j], [.8j, .6]])
+    return [
+        qior.with_reflectivity(.3, dims, acting_on = (0, 1)),
+        qior.InputOutputRelation(matrix, dims, acting_on = (2, 0)),
+        qior.InputOutputRelation(matrix, dims, acting_on = (1, 2)),
+    ]
+
+@pytest.mark.parametrize("relation", relations())
+def test_matches_qobj_evolution(relation):
+    psi = (number_state(1, 1, 0) + .5j * number_state(0, 1, 1) +
+           .3 * number_state(1, 0, 1)).unit()
+    final_state = relation(qior.SparseState.from_qobj(psi)).to_qobj()
+    assert (final_state - relation(psi)).norm() < 1e-12
+
+def test_chain_matches_qobj_evolution():
+    psi = number_state(1, 1, 0)
+    sparse_state = qior.SparseState.from_qobj(psi)
+    for relation in relations()[:2]:
+        psi = relation(psi)
+        sparse_state = relation(sparse_state)
+    assert (sparse_state.to_qobj() - psi).norm() < 1e-12
+
+@pytest.mark.parametrize("psi", [
+    number_state(2, 1, 0),
+    (number_state(0, 0, 0) + number_state(1, 2, 0)).unit(),
+])
+def test_leaks_raise_like_evolve(psi):
+    relation = relations()[0]
+    with pytest.raises(ValueError):
+        relation(psi)
+    with pytest.raises(ValueError):
+        relation(qior.SparseState.from_qobj(psi))
+
+def test_leak_check_is_per_number_state():
+    # evolve rejects this state, since the largest photon numbers of the two
+    # modes, taken from different number states, add up to the cutoff
+    small = (3, 3)
+    psi = (number_state(2, 0, dims = small) + number_state(0, 2, dims = small)).unit()
+    relation = qior.with_reflectivity(.3, small)
+    with pytest.raises(ValueError):
+        relation(psi)
+    # but each of its number states has two photons, so none of them leaks
+    final_state = relation(qior.SparseState.from_qobj(psi)).to_qobj()
+    assert (final_state - relation.U * psi).norm() < 1e-12
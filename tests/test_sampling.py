@@ -0,0 +1,62 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along
+# with qior. If not, see <https://www.gnu.org/licenses/>.
+"""
+Sampling of output photon numbers, compared with the output states.
+"""
+import itertools
+import math
+
+import numpy as np
+import qutip as qp
+
+import qior
+from qior.sampling import permanent_minors
+
+dims = (3, 3, 3)
+
+def chain():
+    matrix = np.array([[.6, .8j], [.8j, .6]])
+    return [qior.with_reflectivity(.3, dims, acting_on = (0, 1)),
+            qior.InputOutputRelation(matrix, dims, acting_on = (1, 2))]
+
+def test_frequencies_match_output_state():
+    occupation = (1, 1, 0)
+    output = qp.tensor(*[qp.basis(d, n) for d, n in zip(dims, occupation)])
+    for relation in chain():
+        output = relation(output)
+    probabilities = abs(output.full().ravel())**2
+
+    size = 20000
+    samples = qior.sample(chain(), occupation, size, rng = 1)
+    assert (samples.sum(axis = 1) == sum(occupation)).all()
+    indices = np.ravel_multi_index(samples.T, dims)
+    frequencies = np.bincount(indices, minlength = len(probabilities)) / size
+    assert np.allclose(frequencies, probabilities, atol = .015)
+
+def test_samples_are_reproducible_with_a_seed():
+    first = qior.sample(chain(), (1, 1, 0), 50, rng = 7)
+    second = qior.sample(chain(), (1, 1, 0), 50, rng = np.random.default_rng(7))
+    assert (first == second).all()
+
+def permanent(matrix):
+    k = len(matrix)
+    return sum(math.prod(matrix[i, p[i]] for i in range(k))
+               for p in itertools.permutations(range(k)))
+
+def test_permanent_minors():
+    rng = np.random.default_rng(0)
+    for k in range(1, 5):
+        rows = rng.normal(size = (2, k, k + 1)) + 1j * rng.normal(size = (2, k, k + 1))
+        expected = [[permanent(np.delete(matrix, l, axis = 1)) for l in range(k + 1)]
+                    for matrix in rows]
+        assert np.allclose(permanent_minors(rows), expected)
@@ -0,0 +1,54 @@
+# Copyright 2023 and later, Andres Agusti Casado
+# This file is part of the python package qior.
+# qior is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any
+# later version.
+# qior is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+# You should have received a copy of the GNU General Public License along
+# with qior. If not, see <https://www.gnu.org/licenses/>.
+"""
+Streaming storage of scans, resumed and read back lazily.
+"""
+import numpy as np
+import qutip as qp
+
+import qior
+
+dims = (3, 3)
+reflectivities = np.linspace(.1, .9, 7)
+
+def evaluate(R):
+    psi = qp.tensor(qp.basis(3, 1), qp.basis(3, 1))
+    return qior.with_reflectivity(R, dims)(psi * psi.dag())
+
+def test_resume_after_interruption(tmp_path):
+    quantities = ("state", "diagonal", "blocks")
+    with qior.ScanWriter(tmp_path, quantities, chunk_size = 3) as writer:
+        writer.extend(reflectivities[:4], evaluate)
+    assert len(qior.ScanReader(tmp_path)) == 4
+
+    evaluated = []
+    def counting(R):
+        evaluated.append(R)
+        return evaluate(R)
+    reader = qior.write_scan(tmp_path, reflectivities, counting, quantities, chunk_size = 3)
+    assert len(reader) == len(reflectivities)
+    assert np.allclose(evaluated, reflectivities[4:])
+    for R, point in zip(reflectivities, reader):
+        expected = evaluate(R).full()
+        assert np.allclose(point["state"], expected)
+        assert np.allclose(point["diagonal"], np.diagonal(expected).real)
+
+def test_read_only_requested_keys(tmp_path):
+    with qior.write_scan(tmp_path, reflectivities, evaluate,
+                         ("state", "diagonal", "blocks"), chunk_size = 3) as reader:
+        point = reader.read(5, ["diagonal"])
+        assert list(point) == ["diagonal"]
+        assert list(reader.loaded_chunk) == ["diagonal"]
+        assert np.allclose(point["diagonal"], evaluate(reflectivities[5]).diag().real)
+        blocks = reader.read(-1, ["blocks"])
+        assert sorted(blocks) == ["blocks-%d" % N for N in range(5)]